@@ -0,0 +1,156 @@
+"""
+Headless SolarServers agent: scans this machine, runs inference locally and
+pushes the results to an aggregator (a server started with SOLAR_MODE=aggregator).
+
+  python SolarServers_agent.py --aggregator ws://collector:8000/agent --host web-01
+
+Every scan becomes a delta frame; frames produced while a send is in flight or
+during the batch window are merged into one, so the agent sends at most one
+message per batch, always deflated binary (SolarServers_wire.py). The first frame
+of a connection, and any frame after the aggregator reports a gap, is a snapshot.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import websockets
+
+from SolarServers_stream import AdaptiveInterval, DeltaEncoder, Subscriber, Tick
+from SolarServers_wire import encode_binary
+
+AGGREGATOR = os.environ.get("SOLAR_AGGREGATOR", "ws://127.0.0.1:8000/agent")
+AGENT_HOST = os.environ.get("SOLAR_AGENT_HOST", socket.gethostname())
+AGENT_TOKEN = os.environ.get("SOLAR_AGENT_TOKEN", "")
+# Seconds of scans merged into one message
+BATCH_SECONDS = float(os.environ.get("SOLAR_AGENT_BATCH", "0.5"))
+# Scans between snapshots; the aggregator asks for one itself when it sees a gap
+KEYFRAME_EVERY = 300
+# Base scan interval, 5 Hz like the server
+INTERVAL = 0.2
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 30.0
+
+
+class Agent:
+    """Scan loop plus one persistent connection to the aggregator, reopened with backoff."""
+
+    def __init__(self, core, url: str = AGGREGATOR, host: str = AGENT_HOST, token: str = AGENT_TOKEN,
+                 batch: float = BATCH_SECONDS, interval: float = INTERVAL, executor=None):
+        self.core = core
+        self.url = url
+        self.host = host
+        self.token = token
+        self.batch = batch
+        self.encoder = DeltaEncoder(KEYFRAME_EVERY)
+        self.pacer = AdaptiveInterval(interval)
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="solar-scan")
+        self.latest: Optional[Tick] = None
+        # Mailbox of the current connection, None while disconnected
+        self.sub: Optional[Subscriber] = None
+        self.stats = {"messages": 0, "bytes": 0, "snapshots": 0, "resyncs": 0, "reconnects": 0}
+
+    async def scan_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = time.perf_counter()
+            churn = 0
+            try:
+                packet, events = await loop.run_in_executor(self.executor, self.core.scan)
+                self.latest = self.encoder.encode(packet, events)
+                churn = self.latest.churn
+                if self.sub is not None:
+                    self.sub.offer(self.latest)
+            except Exception as e:
+                print("Error scanning core:", e)
+            await asyncio.sleep(self.pacer.update(time.perf_counter() - start, churn))
+
+    async def _receive(self, ws, sub: Subscriber):
+        # Aggregator -> agent: {"type": "resync"} after a sequence gap
+        async for message in ws:
+            try:
+                msg = json.loads(message)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(msg, dict) and msg.get("type") == "resync" and self.latest is not None:
+                self.stats["resyncs"] += 1
+                sub.resync(self.latest)
+
+    async def push(self):
+        """One connection: send merged frames until it drops"""
+        headers = {"X-Solar-Host": self.host}
+        if self.token:
+            headers["X-Solar-Token"] = self.token
+        # Frames are deflated here, so no per-message compression on top
+        async with websockets.connect(self.url, additional_headers=headers, compression=None, max_size=None) as ws:
+            print(f"Agent {self.host} connected to {self.url}")
+            sub = Subscriber(delta=True, fmt="binary")
+            if self.latest is not None:
+                sub.resync(self.latest)
+            self.sub = sub
+            receiver = asyncio.create_task(self._receive(ws, sub))
+            try:
+                while True:
+                    frame = await sub.next()
+                    if receiver.done():
+                        receiver.result()
+                    data = encode_binary(frame.data, compress_min=0)
+                    await ws.send(data)
+                    self.stats["messages"] += 1
+                    self.stats["bytes"] += len(data)
+                    self.stats["snapshots"] += frame.type == "snapshot"
+                    # Scans during the wait are merged into the next message
+                    await asyncio.sleep(self.batch)
+            finally:
+                self.sub = None
+                receiver.cancel()
+
+    async def connect_loop(self):
+        delay = RECONNECT_MIN
+        while True:
+            started = time.monotonic()
+            try:
+                await self.push()
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                print(f"Agent {self.host}: aggregator connection failed ({e}), retrying in {delay:.0f}s")
+            # Back off only while connections keep failing fast
+            if time.monotonic() - started > RECONNECT_MAX:
+                delay = RECONNECT_MIN
+            await asyncio.sleep(delay)
+            delay = min(RECONNECT_MAX, delay * 2)
+            self.stats["reconnects"] += 1
+
+    async def run(self):
+        await asyncio.gather(self.scan_loop(), self.connect_loop())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan this machine and push to a SolarServers aggregator")
+    parser.add_argument("--aggregator", default=AGGREGATOR, help=f"aggregator /agent URL (default {AGGREGATOR})")
+    parser.add_argument("--host", default=AGENT_HOST, help="name of this host in the merged view")
+    parser.add_argument("--token", default=AGENT_TOKEN, help="shared secret, if the aggregator sets SOLAR_AGENT_TOKEN")
+    parser.add_argument("--batch", type=float, default=BATCH_SECONDS, help="seconds of scans merged into one message")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="base scan interval in seconds")
+    args = parser.parse_args()
+
+    from SolarServers_core import SolarServersCore
+    core = SolarServersCore()
+    print(f"SolarServers agent {args.host} online (admin: {core.meta.get('is_admin', False)})")
+    agent = Agent(core, args.aggregator, args.host, args.token, args.batch, args.interval)
+    try:
+        asyncio.run(agent.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.executor.shutdown(wait=False, cancel_futures=True)
+        core.shutdown()
+        print(f"SolarServers agent {args.host} stopped")
+
+
+if __name__ == "__main__":
+    main()
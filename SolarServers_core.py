@@ -2,9 +2,28 @@ import psutil as ps
 import os
 import ctypes
 import platform
-from typing import List, Dict
-import numpy as np
-import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Dict, Tuple
+from SolarServers_scanner import ProcessIndex, select_scanner
+from SolarServers_dns import DomainResolver
+from SolarServers_events import ConnEvent, ConnectionTracker
+from SolarServers_flows import FlowAggregator
+from SolarServers_metrics import REGISTRY
+from SolarServers_records import ConnRecord, pack_ip
+
+# Threads for the blocking I/O stages (process names, reverse DNS)
+SCAN_THREADS = int(os.environ.get("SOLAR_SCAN_THREADS", "4"))
+# Worker processes for inference, 0 keeps inference in the scan thread
+INFERENCE_PROCESSES = int(os.environ.get("SOLAR_INFERENCE_PROCESSES", "0"))
+# background: scans start right away with is_threat pending (null) until the model is loaded
+# eager: load before the first scan, off: no AI
+AI_LOAD = os.environ.get("SOLAR_AI_LOAD", "background")
+# Feed the traffic windows to the model; off, every row is scored from the baseline
+# templates. Only ESTABLISHED sockets are seen, so the error rates are always 0 and
+# the windows flag most ordinary traffic off ports 80/443 as attacks
+USE_WINDOWS = os.environ.get("SOLAR_WINDOW_FEATURES", "") == "1"
 
 IGNORE_APPS = [
     'svchost.exe','system','searchhost.exe','runtimebroker.exe',
@@ -24,30 +43,84 @@ BROWSERS = [
     "opera.exe"
 ]
 
-try:
-    from ai_engine import AIEngine
-    AI_AVAILABLE = True
-except ImportError:
-    AI_AVAILABLE = False
+SCAN_STAGE_SECONDS = REGISTRY.histogram("solar_scan_stage_seconds", "Duration of each get_packet stage", label="stage")
+SCAN_SECONDS = REGISTRY.histogram("solar_scan_seconds", "Duration of a whole get_packet call")
+CONNECTIONS_SCANNED = REGISTRY.counter("solar_connections_scanned_total", "Sockets enumerated by the scanner")
+CONNECTIONS_IGNORED = REGISTRY.counter("solar_connections_ignored_total", "New sockets dropped because their app is in IGNORE_APPS")
+
+_worker_ai = None
+
+def _init_inference_worker():
+    global _worker_ai
+    from ai_engine import get_engine
+    _worker_ai = get_engine()
+
+def _infer_rows(rows):
+    return _worker_ai.classify_batch(rows)
 
 class SolarServersCore:
-    def __init__(self):
+    def __init__(self, io_threads: int = SCAN_THREADS, inference_processes: int = INFERENCE_PROCESSES, resolver: DomainResolver = None, ai_load: str = AI_LOAD,
+                 use_windows: bool = USE_WINDOWS):
+        t = time.perf_counter()
+        self.startup_timings = {}
         self.pid = os.getpid()
-        self.name_cache = {}
-        self.dns_cache = {}
+        self.stage_timings = {}
         self.meta = self._hardware_scan()
-        if AI_AVAILABLE:
-            try:
-                self.ai = AIEngine()
-                print("AI initialized")
-            except Exception:
-                self.ai = None
-                print("AI failed to initialize")
-        else:
-            self.ai = None
+        t = self._lap(self.startup_timings, "hardware", t)
+        self.procs = ProcessIndex()
+        self.scanner = select_scanner(index=self.procs)
+        self.use_windows = use_windows
+        # Nothing reads the traffic windows unless they feed the model
+        self.flows = FlowAggregator() if use_windows else None
+        # Event stage state: live sockets by flow key, their ids, and what is still waiting on DNS
+        self.records: Dict[tuple, ConnRecord] = {}
+        self.ignored = set()
+        self.unresolved: Dict[tuple, ConnRecord] = {}
+        self.tracker = ConnectionTracker()
+        self.events: List[ConnEvent] = []
+        self.verdict_state = None
+        t = self._lap(self.startup_timings, "scanner", t)
+        self.resolver = resolver or DomainResolver()
+        self.resolver.start()
+        t = self._lap(self.startup_timings, "dns", t)
+        self.io_pool = ThreadPoolExecutor(max_workers=max(1, io_threads), thread_name_prefix="solar-io")
+        self.inference_processes = inference_processes
+        self.inference_pool = None
+        self.ai = None
+        self.ai_state = "off"
 
-        print(f"SolarServers Core Online | PID {self.pid}")
+        if ai_load == "eager":
+            self._load_ai()
+        elif ai_load != "off":
+            self.ai_state = "loading"
+            threading.Thread(target=self._load_ai, name="solar-ai-load", daemon=True).start()
+
+        print(f"SolarServers Core Online | PID {self.pid} | Scanner {self.scanner.name}")
         print(f"Meta: {self.meta}")
+        print("Startup: " + " | ".join(f"{k} {v}ms" for k, v in self.startup_timings.items()))
+
+    def _load_ai(self):
+        timings = {}
+        t = time.perf_counter()
+        try:
+            from ai_engine import get_engine
+            t = self._lap(timings, "ai_import", t)
+            ai = get_engine()
+            t = self._lap(timings, "ai_load", t)
+            if self.inference_processes > 0:
+                self.inference_pool = ProcessPoolExecutor(max_workers=self.inference_processes, initializer=_init_inference_worker)
+                print(f"Inference pool: {self.inference_processes} processes")
+        except ImportError as e:
+            self.ai_state = "unavailable"
+            print("AI unavailable:", e)
+        except Exception as e:
+            self.ai_state = "failed"
+            print("AI failed to initialize:", e)
+        else:
+            self.ai = ai
+            self.ai_state = "ready"
+            print("AI initialized | " + " | ".join(f"{k} {v}ms" for k, v in timings.items()))
+        self.startup_timings.update(timings)
 
     def _hardware_scan(self) -> Dict:
         try:
@@ -73,122 +146,161 @@ class SolarServersCore:
             "is_admin": is_admin,
             "ram_gb": round(ram, 2)
         }
-    def _scan_connections(self) -> List[Dict]:
-        results = []
+    def _scan_connections(self) -> List[ConnEvent]:
+        """One tick: enumerate sockets, then do the per-connection work for new and changed ones only"""
+        timings = {}
+        t = time.perf_counter()
+        now = time.time()
 
-        try:
-            connections = ps.net_connections(kind="inet")
-        except Exception:
-            return results
+        self.procs.refresh(self.io_pool.map)
+        t = self._lap(timings, "processes", t)
 
-        for c in connections:
-            if not c.pid or not c.raddr:
-                continue
-            if c.pid == self.pid:
-                continue
-            if c.status != "ESTABLISHED":
-                continue
+        sockets = self.scanner.scan(exclude_pid=self.pid)
+        t = self._lap(timings, "enumerate", t)
 
-            if c.pid not in self.name_cache:
-                try:
-                    self.name_cache[c.pid] = ps.Process(c.pid).name()
-                except:
-                    self.name_cache[c.pid] = "System/Hidden"
+        windows = {}
+        if self.flows is not None:
+            # Traffic windows see every socket, ignored apps included
+            windows = self.flows.update(sockets)
+            t = self._lap(timings, "flows", t)
 
-            app_name = self.name_cache[c.pid]
+        key = FlowAggregator.key
+        current = {key(c): c for c in sockets}
+        closed = [k for k in self.records if k not in current]
+        for k in closed:
+            del self.records[k]
+            self.unresolved.pop(k, None)
+        self.ignored = {k for k in self.ignored if k in current}
+        new = [(k, c) for k, c in current.items() if k not in self.records and k not in self.ignored]
+        t = self._lap(timings, "diff", t)
 
-            if app_name.lower() in [i.lower() for i in IGNORE_APPS]:
-                continue
+        names = {pid: self.procs.name(pid) for pid in {c.pid for _, c in new}}
+        t = self._lap(timings, "names", t)
 
-            isBrowser = app_name.lower() in BROWSERS
-            domain = None
+        ignored = {i.lower() for i in IGNORE_APPS}
+        CONNECTIONS_SCANNED.inc(len(sockets))
+        kept = []
+        for k, c in new:
+            if names[c.pid].lower() in ignored:
+                self.ignored.add(k)
+            else:
+                kept.append((k, c))
+        CONNECTIONS_IGNORED.inc(len(new) - len(kept))
 
+        opened = []
+        for k, c in kept:
+            app_name = names[c.pid]
+            isBrowser = app_name.lower() in BROWSERS
+            record = ConnRecord(
+                app_name, int(c.pid), pack_ip(c.ip), int(c.port) if c.port else 0, c.lport,
+                browser=isBrowser,
+            )
+            record.window = windows.get(k)
+            self.records[k] = record
+            opened.append((k, record))
             if isBrowser:
-                domain = self._resolve_domain(c.raddr.ip)
-
-            entry = {
-                "id": (
-                    f"{app_name}_{domain}_{c.raddr.ip}_{c.raddr.port}"
-                    if isBrowser and domain
-                    else f"{app_name}_{c.pid}_{c.raddr.ip}_{c.raddr.port}"
-                ),
-                "app": str(app_name),
-                "pid": int(c.pid),
-                "ip": str(c.raddr.ip) if c.raddr and c.raddr.ip else "0.0.0.0",
-                "port": int(c.raddr.port) if c.raddr and c.raddr.port else 0,
-                "type": "browser" if isBrowser else "process",
-                "domain": domain,
-            }
-
-            if self.ai:
-                try:
-                    entry["is_threat"] = bool(np.array(self.ai.predict_threat(entry["ip"], entry["port"], "ESTABLISHED", entry.get("domain"))).item())
-                except Exception:
-                    entry["is_threat"] = False
-            else:
-                entry["is_threat"] = False
+                self.unresolved[k] = record
+        t = self._lap(timings, "build", t)
 
-            if entry.get("type") == "browser":
-                entry["risk_weight"] = 0.5
-            else:
-                entry["risk_weight"] = 1.0
+        # Cached names only; misses are looked up in the background and show up on a later tick
+        changed = []
+        for k, record in list(self.unresolved.items()):
+            domain = self.resolver.get(record.ip_str)
+            if domain:
+                record.domain = domain
+                del self.unresolved[k]
+                if self.tracker.socket_ids.get(k) is not None:
+                    changed.append((k, record))
+        t = self._lap(timings, "dns", t)
+
+        if self.verdict_state != self.ai_state:
+            # The model became ready (or went away): every live verdict is stale
+            self.verdict_state = self.ai_state
+            changed = [(k, r) for k, r in self.records.items() if self.tracker.socket_ids.get(k) is not None]
+            self._classify([r for _, r in opened + changed])
+        else:
+            self._classify([r for _, r in opened] + [r for _, r in changed])
+        t = self._lap(timings, "inference", t)
+
+        self.events = self.tracker.apply(opened, closed, changed, now)
+        self._lap(timings, "events", t)
+
+        self.stage_timings = timings
+        return self.events
+
+    def _lap(self, timings: Dict, stage: str, start: float) -> float:
+        now = time.perf_counter()
+        timings[stage] = round((now - start) * 1000, 3)
+        return now
+
+    def _classify(self, records: List[ConnRecord]):
+        if self.ai_state == "loading":
+            for record in records:
+                record.is_threat = None  # pending
+                record.threat_score = 0.0
+            return
+        if not self.ai:
+            for record in records:
+                record.is_threat = False
+                record.threat_score = 0.0
+            return
 
-            results.append(entry)
+        rows = [(r.ip_str, r.port, "ESTABLISHED", r.domain, r.window) for r in records]
 
-        return results
-    
-    def _resolve_domain(self, ip: str) -> str:
-        if ip in self.dns_cache:
-            return self.dns_cache[ip]
+        if self.inference_pool and rows:
+            try:
+                n = self.inference_processes
+                chunks = [rows[i::n] for i in range(n)]
+                verdicts = [None] * len(rows)
+                scores = [0.0] * len(rows)
+                for i, (chunk_verdicts, chunk_scores) in enumerate(self.inference_pool.map(_infer_rows, chunks)):
+                    verdicts[i::n] = chunk_verdicts
+                    scores[i::n] = chunk_scores
+                self._set_verdicts(records, verdicts, scores)
+                return
+            except Exception as e:
+                print("Inference pool failed, falling back:", e)
 
         try:
-            domain = socket.gethostbyaddr(ip)[0]
+            verdicts, scores = self.ai.classify_batch(rows)
         except Exception:
-            domain = None
-
-        # Clean up the domain to show more user-friendly names
-        if domain:
-            domain = domain.lower()
-            
-            # Skip generic hosting/infrastructure names
-            generic_patterns = [
-                'ec2-', 'compute-', 'server-', 'host-', 'node-',
-                'ip-', 'static-', 'dynamic-', 'dhcp-', 'nat-',
-                'gateway-', 'router-', 'switch-', 'proxy-',
-                'cdn-', 'edge-', 'cache-', 'lb-', 'loadbalancer-',
-                'aws-', 'gcp-', 'azure-', 'cloud-', 'vm-',
-                'container-', 'pod-', 'k8s-', 'docker-'
-            ]
-            
-            if any(pattern in domain for pattern in generic_patterns):
-                domain = None
-            
-            # Try to extract actual domain from subdomains
-            if domain:
-                parts = domain.split('.')
-                # For patterns like "something.google.com" -> try "google.com"
-                if len(parts) >= 3:
-                    # Check if the last two parts form a known TLD + domain
-                    potential_domain = '.'.join(parts[-2:])
-                    if potential_domain in ['google.com', 'facebook.com', 'amazon.com', 'microsoft.com', 
-                                          'apple.com', 'youtube.com', 'twitter.com', 'instagram.com',
-                                          'linkedin.com', 'github.com', 'stackoverflow.com', 'reddit.com']:
-                        domain = potential_domain
-                    # For .com, .org, .net, .edu, etc.
-                    elif len(parts) >= 2 and parts[-1] in ['com', 'org', 'net', 'edu', 'gov', 'io', 'co', 'ai']:
-                        domain = '.'.join(parts[-2:])
-
-        self.dns_cache[ip] = domain
-        return domain
+            verdicts, scores = [False] * len(rows), [0.0] * len(rows)
+        self._set_verdicts(records, verdicts, scores)
 
-    def get_packet(self) -> Dict:
-        return {
+    @staticmethod
+    def _set_verdicts(records: List[ConnRecord], verdicts, scores):
+        for record, verdict, score in zip(records, verdicts, scores):
+            record.is_threat = bool(verdict)
+            # Three decimals are plenty for ranking and keep the wire short
+            record.threat_score = round(float(score), 3)
+
+    def scan(self) -> Tuple[Dict, List[ConnEvent]]:
+        """(packet, this tick's connection events)"""
+        start = time.perf_counter()
+        events = self._scan_connections()
+        t = time.perf_counter()
+        packet = {
             "meta": {
                 "tier": self.meta["tier"],
                 "is_admin": self.meta["is_admin"]
             },
-            "connections": self._scan_connections()
+            # Wire dicts are built by the event stage for changed ids only, one per id
+            "connections": self.tracker.wires()
         }
+        self._lap(self.stage_timings, "serialize", t)
+        for stage, ms in self.stage_timings.items():
+            SCAN_STAGE_SECONDS.observe(ms / 1000, stage)
+        SCAN_SECONDS.observe(time.perf_counter() - start)
+        return packet, events
+
+    def get_packet(self) -> Dict:
+        return self.scan()[0]
+
+    def shutdown(self):
+        self.resolver.shutdown()
+        self.io_pool.shutdown(wait=False, cancel_futures=True)
+        if self.inference_pool:
+            self.inference_pool.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
     core = SolarServersCore()
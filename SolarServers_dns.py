@@ -0,0 +1,201 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+DNS_CONCURRENCY = int(os.environ.get("SOLAR_DNS_CONCURRENCY", "16"))
+DNS_CACHE_SIZE = 4096
+DNS_POSITIVE_TTL = 3600.0  # seconds
+DNS_NEGATIVE_TTL = 300.0
+DNS_TIMEOUT = 2.0
+
+# Skip generic hosting/infrastructure names
+GENERIC_PATTERNS = [
+    'ec2-', 'compute-', 'server-', 'host-', 'node-',
+    'ip-', 'static-', 'dynamic-', 'dhcp-', 'nat-',
+    'gateway-', 'router-', 'switch-', 'proxy-',
+    'cdn-', 'edge-', 'cache-', 'lb-', 'loadbalancer-',
+    'aws-', 'gcp-', 'azure-', 'cloud-', 'vm-',
+    'container-', 'pod-', 'k8s-', 'docker-'
+]
+
+KNOWN_SITES = [
+    'google.com', 'facebook.com', 'amazon.com', 'microsoft.com',
+    'apple.com', 'youtube.com', 'twitter.com', 'instagram.com',
+    'linkedin.com', 'github.com', 'stackoverflow.com', 'reddit.com'
+]
+
+COMMON_TLDS = ['com', 'org', 'net', 'edu', 'gov', 'io', 'co', 'ai']
+
+
+def clean_domain(domain: Optional[str]) -> Optional[str]:
+    """Clean up a PTR name to show more user-friendly names"""
+    if not domain:
+        return None
+    domain = domain.lower()
+
+    if any(pattern in domain for pattern in GENERIC_PATTERNS):
+        return None
+
+    # Try to extract actual domain from subdomains
+    parts = domain.split('.')
+    # For patterns like "something.google.com" -> try "google.com"
+    if len(parts) >= 3:
+        potential_domain = '.'.join(parts[-2:])
+        if potential_domain in KNOWN_SITES:
+            domain = potential_domain
+        # For .com, .org, .net, .edu, etc.
+        elif parts[-1] in COMMON_TLDS:
+            domain = '.'.join(parts[-2:])
+    return domain
+
+
+class DomainResolver:
+    """Non-blocking reverse DNS with a bounded TTL cache.
+
+    get() never blocks: it returns the cached name (or None) and schedules a lookup
+    on a background event loop. Concurrent lookups are capped by a semaphore and
+    each IP has at most one lookup in flight. `lookup` is any coroutine function
+    ip -> hostname or None, so tests can swap in a local stub.
+    """
+
+    def __init__(
+        self,
+        lookup: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+        concurrency: int = DNS_CONCURRENCY,
+        cache_size: int = DNS_CACHE_SIZE,
+        positive_ttl: float = DNS_POSITIVE_TTL,
+        negative_ttl: float = DNS_NEGATIVE_TTL,
+        timeout: float = DNS_TIMEOUT,
+    ):
+        self.lookup = lookup
+        self.concurrency = max(1, concurrency)
+        self.cache_size = cache_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.scheduled: Set[str] = set()
+        self.lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.dns = None
+        self.stats = {"hits": 0, "misses": 0, "lookups": 0, "failures": 0, "deduplicated": 0, "evictions": 0}
+
+    def start(self):
+        if self.thread:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="solar-dns", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def shutdown(self):
+        if self.loop and self.thread:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=1)
+        self.thread = None
+
+    async def _system_lookup(self, ip: str) -> Optional[str]:
+        if self.dns is None:
+            # aiodns/pycares is imported on the first real lookup, not at startup
+            try:
+                import aiodns
+                self.dns = aiodns.DNSResolver(loop=asyncio.get_running_loop())
+            except Exception:
+                self.dns = False
+        if self.dns:
+            return (await self.dns.gethostbyaddr(ip)).name
+        host, _ = await asyncio.get_running_loop().getnameinfo((ip, 0), socket.NI_NAMEREQD)
+        return host
+
+    def _cached(self, ip: str):
+        item = self.cache.get(ip)
+        if item is None:
+            return False, None
+        expires, domain = item
+        if expires < time.monotonic():
+            del self.cache[ip]
+            return False, None
+        self.cache.move_to_end(ip)
+        return True, domain
+
+    def _store(self, ip: str, domain: Optional[str], ttl: float):
+        with self.lock:
+            self.cache[ip] = (time.monotonic() + ttl, domain)
+            self.cache.move_to_end(ip)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    async def resolve(self, ip: str) -> Optional[str]:
+        """Resolve and cache one IP, joining a lookup already in flight"""
+        with self.lock:
+            found, domain = self._cached(ip)
+            if found:
+                return domain
+            pending = self.inflight.get(ip)
+            if pending is None:
+                pending = self.inflight[ip] = asyncio.get_running_loop().create_future()
+                owner = True
+            else:
+                self.stats["deduplicated"] += 1
+                owner = False
+        if not owner:
+            return await asyncio.shield(pending)
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        lookup = self.lookup or self._system_lookup
+        domain = None
+        try:
+            async with self.semaphore:
+                self.stats["lookups"] += 1
+                name = await asyncio.wait_for(lookup(ip), self.timeout)
+            domain = clean_domain(name)
+            self._store(ip, domain, self.positive_ttl if name else self.negative_ttl)
+        except Exception:
+            self.stats["failures"] += 1
+            self._store(ip, None, self.negative_ttl)
+        finally:
+            with self.lock:
+                self.inflight.pop(ip, None)
+            pending.set_result(domain)
+        return domain
+
+    def get(self, ip: str) -> Optional[str]:
+        """Cached domain for ip, or None while a lookup is scheduled in the background"""
+        with self.lock:
+            found, domain = self._cached(ip)
+            if found:
+                self.stats["hits"] += 1
+                return domain
+            self.stats["misses"] += 1
+            if ip in self.inflight or ip in self.scheduled or not self.loop:
+                return None
+            # Repeated ticks must not queue the same lookup twice
+            self.scheduled.add(ip)
+        asyncio.run_coroutine_threadsafe(self._scheduled(ip), self.loop)
+        return None
+
+    async def _scheduled(self, ip: str):
+        try:
+            await self.resolve(ip)
+        finally:
+            with self.lock:
+                self.scheduled.discard(ip)
+
+    def metrics(self) -> Dict:
+        return {"cached": len(self.cache), "inflight": len(self.inflight), "queued": len(self.scheduled), **self.stats}
@@ -0,0 +1,118 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from SolarServers_records import ConnRecord
+
+OPENED = "opened"
+CLOSED = "closed"
+VERDICT_CHANGED = "verdict_changed"
+# Wire fields other than the verdict changed, e.g. another socket now represents a shared id
+UPDATED = "updated"
+
+
+class ConnEvent:
+    """One change to a connection id: its wire dict after the change (before it, for closed)."""
+
+    __slots__ = ("kind", "ts", "id", "wire", "duration")
+
+    def __init__(self, kind: str, ts: float, id: str, wire: Dict, duration: float = 0.0):
+        self.kind = kind
+        self.ts = ts
+        self.id = id
+        self.wire = wire
+        self.duration = duration
+
+    def __repr__(self):
+        return f"ConnEvent({self.kind}, {self.id})"
+
+
+def _verdict(records: Iterable[ConnRecord]) -> Optional[bool]:
+    # A connection id is a threat when any of its sockets is; null while any is pending
+    pending = False
+    for r in records:
+        if r.is_threat:
+            return True
+        pending |= r.is_threat is None
+    return None if pending else False
+
+
+class _Conn:
+    __slots__ = ("records", "opened", "wire")
+
+    def __init__(self, opened: float):
+        # Socket key -> record; the first one represents the id on the wire
+        self.records: Dict[tuple, ConnRecord] = {}
+        self.opened = opened
+        self.wire: Optional[Dict] = None
+
+
+class ConnectionTracker:
+    """Live connections keyed by wire id, kept from one tick to the next.
+
+    Several sockets can share an id (same app, pid or domain, ip and port), so an
+    id opens with its first socket and closes with its last. apply() takes only
+    the sockets that opened, closed or changed this tick and returns the id-level
+    events, so its cost follows churn, not the size of the table.
+    """
+
+    def __init__(self):
+        self.conns: Dict[str, _Conn] = {}
+        self.socket_ids: Dict[tuple, str] = {}
+
+    def __len__(self):
+        return len(self.conns)
+
+    def wires(self) -> List[Dict]:
+        return [c.wire for c in self.conns.values()]
+
+    def apply(self, opened: List[Tuple[tuple, ConnRecord]], closed: Iterable[tuple],
+              changed: Iterable[Tuple[tuple, ConnRecord]], now: float) -> List[ConnEvent]:
+        before: Dict[str, Optional[Dict]] = {}
+
+        def touch(cid):
+            if cid not in before:
+                conn = self.conns.get(cid)
+                before[cid] = conn.wire if conn else None
+
+        def detach(key):
+            cid = self.socket_ids.pop(key, None)
+            if cid is not None:
+                touch(cid)
+                del self.conns[cid].records[key]
+
+        def attach(key, record):
+            cid = record.id
+            touch(cid)
+            conn = self.conns.get(cid)
+            if conn is None:
+                conn = self.conns[cid] = _Conn(now)
+            conn.records[key] = record
+            self.socket_ids[key] = cid
+
+        for key in closed:
+            detach(key)
+        for key, record in changed:
+            # Same id as before (ids do not depend on the domain), so this ends in updated or verdict_changed
+            detach(key)
+            attach(key, record)
+        for key, record in opened:
+            attach(key, record)
+
+        closes, others = [], []
+        for cid, old in before.items():
+            conn = self.conns[cid]
+            if not conn.records:
+                del self.conns[cid]
+                if old is not None:
+                    closes.append(ConnEvent(CLOSED, now, cid, old, now - conn.opened))
+                continue
+            wire = next(iter(conn.records.values())).to_wire()
+            wire["is_threat"] = _verdict(conn.records.values())
+            wire["threat_score"] = max(r.threat_score for r in conn.records.values())
+            conn.wire = wire
+            if old is None:
+                others.append(ConnEvent(OPENED, now, cid, wire))
+            elif old["is_threat"] != wire["is_threat"]:
+                others.append(ConnEvent(VERDICT_CHANGED, now, cid, wire, now - conn.opened))
+            elif old != wire:
+                others.append(ConnEvent(UPDATED, now, cid, wire, now - conn.opened))
+        return closes + others
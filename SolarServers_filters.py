@@ -0,0 +1,129 @@
+import fnmatch
+import heapq
+import re
+from typing import Dict, List, Optional
+
+# Connection types a subscription can select
+TYPES = ("browser", "process")
+# Upper bound on a requested top-K
+MAX_LIMIT = 10000
+
+
+def rank(conn: Dict) -> tuple:
+    """Sort key for top-K: threats first, then the highest model threat_score, then risk_weight"""
+    return (conn["is_threat"] is not True, -conn.get("threat_score", 0.0), -conn["risk_weight"])
+
+
+def _port_ranges(ports) -> tuple:
+    ranges = []
+    for p in ports:
+        lo, hi = (p, p) if isinstance(p, int) else p
+        if not (isinstance(lo, int) and isinstance(hi, int) and 0 <= lo <= hi <= 65535):
+            raise ValueError(f"invalid port range {p!r}")
+        ranges.append((lo, hi))
+    return tuple(sorted(set(ranges)))
+
+
+def _as_list(value) -> List:
+    return [value] if isinstance(value, (str, int)) else list(value)
+
+
+class Subscription:
+    """Server-side filter and top-K limit for one /ws subscriber.
+
+    Subscriptions with the same normalized fields compare and hash equal, so the
+    broadcaster filters each distinct one once per tick and shares the result.
+    """
+
+    __slots__ = ("apps", "type", "threats_only", "ports", "domains", "hosts", "limit", "key", "_domain_re")
+
+    def __init__(self, apps=None, type: Optional[str] = None, threats_only: bool = False,
+                 ports=None, domains=None, hosts=None, limit: Optional[int] = None):
+        self.apps = frozenset(a.lower() for a in _as_list(apps)) if apps else None
+        if type is not None and type not in TYPES:
+            raise ValueError(f"type must be one of {', '.join(TYPES)}")
+        self.type = type
+        if not isinstance(threats_only, bool):
+            raise ValueError("threats_only must be true or false")
+        self.threats_only = threats_only
+        self.ports = _port_ranges(_as_list(ports)) if ports else None
+        self.domains = tuple(sorted({d.lower() for d in _as_list(domains)})) if domains else None
+        # Agent host names, on an aggregator
+        self.hosts = frozenset(_as_list(hosts)) if hosts else None
+        if limit is not None and (isinstance(limit, bool) or not (isinstance(limit, int) and 0 < limit <= MAX_LIMIT)):
+            raise ValueError(f"limit must be an integer between 1 and {MAX_LIMIT}")
+        self.limit = limit
+        self.key = (self.apps, self.type, self.threats_only, self.ports, self.domains, self.hosts, self.limit)
+        # Glob patterns ("*.github.com") compiled into one regex
+        self._domain_re = (
+            re.compile("|".join(fnmatch.translate(d) for d in self.domains)) if self.domains else None
+        )
+
+    @classmethod
+    def from_message(cls, msg: Dict) -> "Subscription":
+        """{"type": "subscribe", "filter": {app, type, threats_only, ports, domain, host}, "limit": K}"""
+        spec = msg.get("filter") or {}
+        if not isinstance(spec, dict):
+            raise ValueError("filter must be an object")
+        unknown = set(spec) - {"app", "type", "threats_only", "ports", "domain", "host"}
+        if unknown:
+            raise ValueError(f"unknown filter fields: {', '.join(sorted(unknown))}")
+        try:
+            return cls(
+                apps=spec.get("app"),
+                type=spec.get("type"),
+                threats_only=spec.get("threats_only", False),
+                ports=spec.get("ports"),
+                domains=spec.get("domain"),
+                hosts=spec.get("host"),
+                limit=msg.get("limit"),
+            )
+        except (TypeError, AttributeError):
+            raise ValueError("malformed subscription")
+
+    @property
+    def filtered(self) -> bool:
+        return self.key != ALL.key
+
+    def __eq__(self, other):
+        return isinstance(other, Subscription) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        fields = {
+            k: sorted(v) if isinstance(v, frozenset) else v
+            for k, v in zip(("app", "type", "threats_only", "ports", "domain", "host", "limit"), self.key) if v
+        }
+        return f"Subscription({fields})"
+
+    def match(self, conn: Dict) -> bool:
+        if self.type is not None and conn["type"] != self.type:
+            return False
+        if self.threats_only and conn["is_threat"] is not True:
+            return False
+        if self.hosts is not None and conn.get("host") not in self.hosts:
+            return False
+        if self.apps is not None and conn["app"].lower() not in self.apps:
+            return False
+        if self.ports is not None and not any(lo <= conn["port"] <= hi for lo, hi in self.ports):
+            return False
+        if self._domain_re is not None and not (conn["domain"] and self._domain_re.match(conn["domain"].lower())):
+            return False
+        return True
+
+    def apply(self, packet: Dict) -> Dict:
+        """The packet as this subscriber sees it; unchanged when nothing is filtered"""
+        if not self.filtered:
+            return packet
+        conns = packet["connections"]
+        if self.key[:-1] != ALL.key[:-1]:
+            conns = [c for c in conns if self.match(c)]
+        if self.limit is not None and len(conns) > self.limit:
+            # Stable, so ties keep scan order and the top-K does not flicker
+            conns = heapq.nsmallest(self.limit, conns, key=rank)
+        return {"meta": packet["meta"], "connections": conns}
+
+
+ALL = Subscription()
@@ -0,0 +1,211 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from SolarServers_events import CLOSED, OPENED, UPDATED, VERDICT_CHANGED, ConnEvent
+from SolarServers_metrics import REGISTRY
+
+# Seconds a disconnected agent's connections stay in the merged view, so a
+# reconnecting agent's snapshot only shows what really changed
+HOST_TIMEOUT = float(os.environ.get("SOLAR_HOST_TIMEOUT", "15"))
+MAX_HOSTS = int(os.environ.get("SOLAR_MAX_HOSTS", "1000"))
+# Shared secret agents send in the X-Solar-Token header; empty accepts any agent
+AGENT_TOKEN = os.environ.get("SOLAR_AGENT_TOKEN", "")
+
+# Merged connection ids are "<host>/<id>"
+SEPARATOR = "/"
+HOST_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+AGENT_FRAMES = REGISTRY.counter("solar_agent_frames_total", "Frames received from agents", label="type")
+AGENT_BYTES = REGISTRY.counter("solar_agent_bytes_total", "Compressed bytes received from agents")
+AGENT_RESYNCS = REGISTRY.counter("solar_agent_resyncs_total", "Snapshots requested from agents after a sequence gap")
+
+
+class Host:
+    """One agent's connections, already namespaced, and its stream position."""
+
+    __slots__ = ("name", "conns", "meta", "seq", "connected", "last_seen", "frames", "bytes")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.conns: Dict[str, Dict] = {}
+        self.meta: Dict = {}
+        self.seq = 0
+        self.connected = True
+        self.last_seen = time.time()
+        self.frames = 0
+        self.bytes = 0
+
+
+class Fleet:
+    """Merged view of every host that pushes to this aggregator; nothing is scanned here.
+
+    Agents (SolarServers_agent.py) send snapshot and delta frames. Their websocket
+    handlers only decode and queue them; scan() applies the queue, so it has the
+    same shape as SolarServersCore.scan() and the server publishes, filters and
+    records the fleet exactly like a local scan. Applying a frame costs as much
+    as the connections it names, so many hosts at 5 Hz stay cheap.
+    """
+
+    def __init__(self, host_timeout: float = HOST_TIMEOUT, max_hosts: int = MAX_HOSTS):
+        self.host_timeout = host_timeout
+        self.max_hosts = max_hosts
+        self.hosts: Dict[str, Host] = {}
+        # Every host's connections by merged id
+        self.conns: Dict[str, Dict] = {}
+        # (kind, host, frame) from the event loop, drained by scan()
+        self.inbox = deque()
+        # Merged id -> wire before this tick touched it, and when each id opened
+        self.before: Dict[str, Optional[Dict]] = {}
+        self.opened: Dict[str, float] = {}
+        # Owned by the event loop: names with a live agent connection
+        self.connected = set()
+        self.meta = {"mode": "aggregator", "is_admin": False}
+        self.stage_timings = {}
+        # hosts and conns are changed by scan() in the scan thread and read by metrics() on the event loop
+        self.lock = threading.Lock()
+
+    def connect(self, name: str) -> Optional[str]:
+        """Claim a host name for a new agent connection; returns why it is refused, if it is"""
+        if not HOST_NAME.match(name):
+            return "host must be 1-64 letters, digits, '.', '_' or '-'"
+        if name in self.connected:
+            return f"host {name} is already connected"
+        if len(self.connected) >= self.max_hosts:
+            return "too many hosts"
+        self.connected.add(name)
+        self.inbox.append(("connect", name, None))
+        return None
+
+    def disconnect(self, name: str):
+        self.connected.discard(name)
+        self.inbox.append(("disconnect", name, None))
+
+    def receive(self, name: str, frame: Dict, size: int):
+        AGENT_FRAMES.inc(1, frame["type"])
+        AGENT_BYTES.inc(size)
+        self.inbox.append(("frame", name, (frame, size)))
+
+    def _touch(self, cid: str):
+        if cid not in self.before:
+            self.before[cid] = self.conns.get(cid)
+
+    def _open(self, host: Host, conn: Dict):
+        cid = conn["id"]
+        self._touch(cid)
+        host.conns[cid] = self.conns[cid] = conn
+
+    def _close(self, host: Host, cid: str):
+        if cid in host.conns:
+            self._touch(cid)
+            del host.conns[cid]
+            del self.conns[cid]
+
+    def _apply(self, host: Host, frame: Dict):
+        prefix = host.name + SEPARATOR
+        if frame["type"] == "snapshot":
+            conns = frame["connections"]
+            seen = set()
+            for c in conns:
+                c["id"] = prefix + c["id"]
+                c["host"] = host.name
+                seen.add(c["id"])
+            for cid in [cid for cid in host.conns if cid not in seen]:
+                self._close(host, cid)
+        else:
+            for cid in frame["removed"]:
+                self._close(host, prefix + cid)
+            # Merged deltas can name a known id under added, or a new one under updated
+            conns = frame["added"] + frame["updated"]
+            for c in conns:
+                c["id"] = prefix + c["id"]
+                c["host"] = host.name
+        for c in conns:
+            self._open(host, c)
+        host.seq = frame["seq"]
+        host.meta = frame.get("meta") or {}
+
+    def _events(self, now: float) -> List[ConnEvent]:
+        # One event per id per tick, however many frames touched it, like ConnectionTracker
+        closes, others = [], []
+        for cid, old in self.before.items():
+            wire = self.conns.get(cid)
+            if wire is None:
+                if old is not None:
+                    closes.append(ConnEvent(CLOSED, now, cid, old, now - self.opened.pop(cid)))
+            elif old is None:
+                self.opened[cid] = now
+                others.append(ConnEvent(OPENED, now, cid, wire))
+            elif old["is_threat"] != wire["is_threat"]:
+                others.append(ConnEvent(VERDICT_CHANGED, now, cid, wire, now - self.opened[cid]))
+            elif old != wire:
+                others.append(ConnEvent(UPDATED, now, cid, wire, now - self.opened[cid]))
+        self.before = {}
+        return closes + others
+
+    def scan(self) -> Tuple[Dict, List[ConnEvent]]:
+        """Apply everything the agents sent since the last call; returns (packet, events)"""
+        t = time.perf_counter()
+        now = time.time()
+        with self.lock:
+            packet, events = self._merge(now)
+        self.stage_timings = {"merge": round((time.perf_counter() - t) * 1000, 3)}
+        return packet, events
+
+    def _merge(self, now: float) -> Tuple[Dict, List[ConnEvent]]:
+        # Only what is queued now; frames arriving meanwhile wait for the next tick
+        for _ in range(len(self.inbox)):
+            kind, name, payload = self.inbox.popleft()
+            host = self.hosts.get(name)
+            if kind == "connect":
+                if host is None:
+                    host = self.hosts[name] = Host(name)
+                host.connected = True
+                host.last_seen = now
+            elif kind == "disconnect":
+                if host is not None:
+                    host.connected = False
+                    host.last_seen = now
+            elif host is not None:
+                frame, size = payload
+                self._apply(host, frame)
+                host.frames += 1
+                host.bytes += size
+                host.last_seen = now
+        for host in [h for h in self.hosts.values() if not h.connected and now - h.last_seen > self.host_timeout]:
+            for cid in list(host.conns):
+                self._close(host, cid)
+            del self.hosts[host.name]
+        events = self._events(now)
+
+        packet = {
+            "meta": {**self.meta, "hosts": sum(h.connected for h in self.hosts.values())},
+            "connections": list(self.conns.values()),
+        }
+        return packet, events
+
+    def metrics(self) -> Dict:
+        now = time.time()
+        with self.lock:
+            return {
+                "connected": len(self.connected),
+                "connections": len(self.conns),
+                "hosts": {
+                    h.name: {
+                        "connected": h.connected,
+                        "connections": len(h.conns),
+                        "seq": h.seq,
+                        "frames": h.frames,
+                        "bytes": h.bytes,
+                        "last_seen_s": round(now - h.last_seen, 1),
+                        "meta": h.meta,
+                    }
+                    for h in self.hosts.values()
+                },
+            }
+
+    def shutdown(self):
+        pass
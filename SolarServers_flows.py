@@ -0,0 +1,190 @@
+import time
+from collections import deque
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+# Time-based window (seconds) and host-based window (connections), as NSL-KDD defines them
+WINDOW_SECONDS = 2.0
+WINDOW_CONNECTIONS = 100
+# Hard cap on the time window so a connection burst cannot grow it without bound
+MAX_WINDOW_EVENTS = 4096
+
+# NSL-KDD traffic features this module computes, in model column order
+WINDOW_FEATURES = [
+    'count', 'srv_count', 'serror_rate', 'srv_serror_rate', 'rerror_rate',
+    'srv_rerror_rate', 'same_srv_rate', 'diff_srv_rate', 'srv_diff_host_rate',
+    'dst_host_count', 'dst_host_srv_count', 'dst_host_same_srv_rate',
+    'dst_host_diff_srv_rate', 'dst_host_same_src_port_rate',
+    'dst_host_srv_diff_host_rate', 'dst_host_serror_rate',
+    'dst_host_srv_serror_rate', 'dst_host_rerror_rate', 'dst_host_srv_rerror_rate',
+]
+
+SERROR_STATES = {"SYN_SENT", "SYN_RECV", "S0"}
+RERROR_STATES = {"CLOSE", "REJ", "RSTO", "RSTR"}
+
+# (time, host, service, src port, serror, rerror)
+Event = Tuple[float, str, int, int, bool, bool]
+
+
+def _rate(part: int, whole: int) -> float:
+    return round(part / whole, 2) if whole else 0.0
+
+
+class WindowCounts:
+    """Counters over a sliding window of connection events.
+
+    add() and each eviction update a fixed set of dict counters, so keeping the
+    window current costs O(1) per event no matter how many events it holds.
+    """
+
+    def __init__(self):
+        self.events: "deque[Event]" = deque()
+        self.host: Dict[str, int] = {}
+        self.srv: Dict[int, int] = {}
+        self.host_srv: Dict[tuple, int] = {}
+        self.host_sport: Dict[tuple, int] = {}
+        self.host_serror: Dict[str, int] = {}
+        self.host_rerror: Dict[str, int] = {}
+        self.srv_serror: Dict[int, int] = {}
+        self.srv_rerror: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    @staticmethod
+    def _bump(counter: Dict, key: Hashable, step: int):
+        value = counter.get(key, 0) + step
+        if value:
+            counter[key] = value
+        else:
+            del counter[key]
+
+    def _apply(self, event: Event, step: int):
+        _, host, srv, sport, serror, rerror = event
+        self._bump(self.host, host, step)
+        self._bump(self.srv, srv, step)
+        self._bump(self.host_srv, (host, srv), step)
+        self._bump(self.host_sport, (host, sport), step)
+        if serror:
+            self._bump(self.host_serror, host, step)
+            self._bump(self.srv_serror, srv, step)
+        if rerror:
+            self._bump(self.host_rerror, host, step)
+            self._bump(self.srv_rerror, srv, step)
+
+    def add(self, event: Event):
+        self.events.append(event)
+        self._apply(event, 1)
+
+    def pop_oldest(self):
+        self._apply(self.events.popleft(), -1)
+
+    def expire_before(self, cutoff: float):
+        while self.events and self.events[0][0] < cutoff:
+            self.pop_oldest()
+
+    def trim_to(self, size: int):
+        while len(self.events) > size:
+            self.pop_oldest()
+
+
+class FlowAggregator:
+    """NSL-KDD time- and host-based traffic features over the live scan stream.
+
+    A connection is an event the first tick it shows up. Its window features are
+    computed then, against the last WINDOW_SECONDS and the last WINDOW_CONNECTIONS
+    events (the current tick included), and kept until it closes, so the window
+    work per tick is proportional to the connections that opened, not to the ones
+    that stayed open.
+
+    Sockets already open at the first scan did not open together, so they only
+    enter the host-based window; their time-based counts cover just themselves.
+    """
+
+    def __init__(self, window_seconds: float = WINDOW_SECONDS, window_connections: int = WINDOW_CONNECTIONS, max_events: int = MAX_WINDOW_EVENTS):
+        self.window_seconds = window_seconds
+        self.window_connections = window_connections
+        self.max_events = max_events
+        self.timed = WindowCounts()
+        self.recent = WindowCounts()
+        self.live: Dict[tuple, tuple] = {}
+        self.primed = False
+        self.stats = {"opened": 0, "closed": 0}
+
+    @staticmethod
+    def key(sock) -> tuple:
+        return (sock.pid, sock.ip, sock.port, sock.lport)
+
+    def update(self, sockets: Iterable, now: Optional[float] = None) -> Dict[tuple, tuple]:
+        """Window feature tuples (WINDOW_FEATURES order) for every live socket, keyed by key()"""
+        now = time.monotonic() if now is None else now
+        sockets = list(sockets)
+        current = {self.key(s): s for s in sockets}
+
+        for k in [k for k in self.live if k not in current]:
+            del self.live[k]
+            self.stats["closed"] += 1
+
+        opened = [(k, s) for k, s in current.items() if k not in self.live]
+        if not self.primed:
+            self.primed = True
+            self._baseline(opened, now)
+            return self.live
+
+        self.timed.expire_before(now - self.window_seconds)
+        if opened:
+            for _, s in opened:
+                event = self._event(s, now)
+                self.timed.add(event)
+                self.recent.add(event)
+            self.timed.trim_to(self.max_events)
+            self.recent.trim_to(self.window_connections)
+            for k, s in opened:
+                self.live[k] = self._features(s.ip, s.port, s.lport)
+            self.stats["opened"] += len(opened)
+        return self.live
+
+    @staticmethod
+    def _event(sock, now: float) -> Event:
+        return (now, sock.ip, sock.port, sock.lport, sock.status in SERROR_STATES, sock.status in RERROR_STATES)
+
+    def _baseline(self, opened, now: float):
+        for _, s in opened:
+            self.recent.add(self._event(s, now))
+        self.recent.trim_to(self.window_connections)
+        for k, s in opened:
+            alone = WindowCounts()
+            alone.add(self._event(s, now))
+            self.live[k] = self._features(s.ip, s.port, s.lport, timed=alone)
+
+    def _features(self, host: str, srv: int, sport: int, timed: Optional[WindowCounts] = None) -> tuple:
+        t, r = timed or self.timed, self.recent
+        count = t.host.get(host, 0)
+        srv_count = t.srv.get(srv, 0)
+        same_srv = t.host_srv.get((host, srv), 0)
+        dst_host_count = r.host.get(host, 0)
+        dst_host_srv_count = r.srv.get(srv, 0)
+        dst_same_srv = r.host_srv.get((host, srv), 0)
+        return (
+            count,
+            srv_count,
+            _rate(t.host_serror.get(host, 0), count),
+            _rate(t.srv_serror.get(srv, 0), srv_count),
+            _rate(t.host_rerror.get(host, 0), count),
+            _rate(t.srv_rerror.get(srv, 0), srv_count),
+            _rate(same_srv, count),
+            _rate(count - same_srv, count),
+            _rate(srv_count - same_srv, srv_count),
+            dst_host_count,
+            dst_host_srv_count,
+            _rate(dst_same_srv, dst_host_count),
+            _rate(dst_host_count - dst_same_srv, dst_host_count),
+            _rate(r.host_sport.get((host, sport), 0), dst_host_count),
+            _rate(dst_host_srv_count - dst_same_srv, dst_host_srv_count),
+            _rate(r.host_serror.get(host, 0), dst_host_count),
+            _rate(r.srv_serror.get(srv, 0), dst_host_srv_count),
+            _rate(r.host_rerror.get(host, 0), dst_host_count),
+            _rate(r.srv_rerror.get(srv, 0), dst_host_srv_count),
+        )
+
+    def metrics(self) -> Dict:
+        return {"live": len(self.live), "time_window": len(self.timed), "host_window": len(self.recent), **self.stats}
@@ -0,0 +1,385 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Events kept in memory, and for how long (seconds)
+HISTORY_SIZE = int(os.environ.get("SOLAR_HISTORY_SIZE", "200000"))
+HISTORY_SECONDS = float(os.environ.get("SOLAR_HISTORY_SECONDS", "3600"))
+# Append-only file that receives events evicted from memory; empty disables spilling
+HISTORY_SPILL = os.environ.get("SOLAR_HISTORY_SPILL", "")
+MAX_RESULTS = 5000
+
+KINDS = ("opened", "closed", "verdict_changed")
+OPENED, CLOSED, VERDICT_CHANGED = range(3)
+KIND_CODES = {name: code for code, name in enumerate(KINDS)}
+BROWSER = 1
+NO_STRING = -1
+# is_threat null (model still loading)
+PENDING = -1
+
+# host is the agent's name on an aggregator, absent (NO_STRING) on a local server
+INDEXED = ("pid", "app", "ip", "domain", "host")
+# Columns holding string ids
+STRING_COLUMNS = ("app", "ip", "domain", "host")
+# The string table is renumbered once more than half of it, and at least this many, is unused
+COMPACT_MIN_STRINGS = 1024
+
+# On-disk row layout of the spill file
+SPILL_DTYPE = np.dtype([
+    ("ts", "<f8"), ("duration", "<f4"), ("pid", "<i4"), ("port", "<i4"),
+    ("app", "<i4"), ("ip", "<i4"), ("domain", "<i4"), ("host", "<i4"),
+    ("kind", "u1"), ("flags", "u1"), ("threat", "i1"), ("pad", "u1"),
+])
+
+COLUMNS = {
+    "ts": np.float64, "duration": np.float32, "pid": np.int32, "port": np.int32,
+    "app": np.int32, "ip": np.int32, "domain": np.int32, "host": np.int32,
+    "kind": np.uint8, "flags": np.uint8, "threat": np.int8,
+}
+
+
+def _threat(value) -> int:
+    return PENDING if value is None else int(bool(value))
+
+
+class _Postings:
+    """Ascending event seqs for one index key.
+
+    Evicted seqs are always the oldest, so eviction only moves `start`; the list
+    is compacted once most of it is dead.
+    """
+
+    __slots__ = ("seqs", "start")
+
+    def __init__(self):
+        self.seqs: List[int] = []
+        self.start = 0
+
+    def __len__(self):
+        return len(self.seqs) - self.start
+
+    def evict_oldest(self):
+        self.start += 1
+        if self.start > 64 and self.start * 2 > len(self.seqs):
+            del self.seqs[:self.start]
+            self.start = 0
+
+    def between(self, lo: int, hi: int) -> List[int]:
+        i = bisect_left(self.seqs, lo, self.start)
+        return self.seqs[i:bisect_left(self.seqs, hi, i)]
+
+
+class _SpillFile:
+    """Append-only event file, read back through a memory map.
+
+    Rows are in time order, so a time range is two binary searches over the ts
+    column. The file has its own string table, kept in a sidecar file with one
+    JSON string per line, so it only holds strings that spilled rows use and the
+    in-memory table can drop and renumber its own.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.strings_path = path + ".strings"
+        self.rows = os.path.getsize(path) // SPILL_DTYPE.itemsize if os.path.exists(path) else 0
+        self.strings = self.load_strings()
+        self.string_ids = {s: i for i, s in enumerate(self.strings)}
+
+    def load_strings(self) -> List[str]:
+        if not os.path.exists(self.strings_path):
+            return []
+        with open(self.strings_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def add_strings(self, strings: Iterable[str]):
+        with open(self.strings_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(s) + "\n" for s in strings)
+
+    def intern(self, ids: np.ndarray, strings: List[str]) -> np.ndarray:
+        """In-memory string ids (indexes into `strings`) as ids in this file's table"""
+        new = []
+        out = np.full(len(ids), NO_STRING, np.int32)
+        for j, i in enumerate(ids.tolist()):
+            if i == NO_STRING:
+                continue
+            s = strings[i]
+            k = self.string_ids.get(s)
+            if k is None:
+                k = self.string_ids[s] = len(self.strings)
+                self.strings.append(s)
+                new.append(s)
+            out[j] = k
+        if new:
+            self.add_strings(new)
+        return out
+
+    def append(self, rows: np.ndarray):
+        with open(self.path, "ab") as f:
+            f.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def between(self, since: float, until: float) -> np.ndarray:
+        if not self.rows:
+            return np.empty(0, SPILL_DTYPE)
+        mm = np.memmap(self.path, dtype=SPILL_DTYPE, mode="r", shape=(self.rows,))
+        ts = mm["ts"]
+        return mm[np.searchsorted(ts, since, "left"):np.searchsorted(ts, until, "right")]
+
+
+class HistoryStore:
+    """Bounded, columnar history of connection open/close events and verdict changes.
+
+    Events live in fixed-size column arrays used as a ring buffer, bounded by
+    `capacity` events and `max_age` seconds. Every event is indexed by pid, app,
+    ip, domain and host, so a query touches only the events in its time range for the
+    most selective key, never the whole buffer. With a spill path, evicted events
+    are appended to a memory-mapped file and stay queryable by time range.
+    Recording takes the core's per-tick events, so it costs as much as the churn.
+    """
+
+    def __init__(self, capacity: int = HISTORY_SIZE, max_age: float = HISTORY_SECONDS, spill_path: str = HISTORY_SPILL):
+        self.capacity = max(1, capacity)
+        self.max_age = max_age
+        self.cols = {name: np.zeros(self.capacity, dtype) for name, dtype in COLUMNS.items()}
+        # Event seqs [tail, head) are live; seq s sits at s % capacity
+        self.head = 0
+        self.tail = 0
+        self.last_ts = 0.0
+        # Interned strings with the number of live events using each; unused ones
+        # (`dead`) keep their id until the next _compact()
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.refs: List[int] = []
+        self.dead = 0
+        self.index: Dict[str, Dict[int, _Postings]] = {name: {} for name in INDEXED}
+        self.spill = _SpillFile(spill_path) if spill_path else None
+        self.spilled = 0
+        self.lock = threading.Lock()
+
+    def _string(self, s: Optional[str]) -> int:
+        """Id of `s`, counting one more live event that uses it"""
+        if s is None:
+            return NO_STRING
+        i = self.string_ids.get(s)
+        if i is None:
+            i = self.string_ids[s] = len(self.strings)
+            self.strings.append(s)
+            self.refs.append(1)
+        else:
+            if not self.refs[i]:
+                self.dead -= 1
+            self.refs[i] += 1
+        return i
+
+    def _compact(self):
+        """Drop the strings no live event uses and renumber the rest, columns and index included"""
+        keep = [i for i, refs in enumerate(self.refs) if refs]
+        # One extra slot, so NO_STRING (-1) maps to itself
+        remap = np.full(len(self.strings) + 1, NO_STRING, np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        self.strings = [self.strings[i] for i in keep]
+        self.refs = [self.refs[i] for i in keep]
+        self.string_ids = {s: i for i, s in enumerate(self.strings)}
+        for name in STRING_COLUMNS:
+            # Slots outside the live range are garbage either way
+            col = self.cols[name]
+            col[:] = remap[col]
+            self.index[name] = {int(remap[i]): postings for i, postings in self.index[name].items()}
+        self.dead = 0
+
+    def record(self, events: Iterable, now: Optional[float] = None):
+        """Append the core's connection events (SolarServers_events.ConnEvent) for one tick"""
+        now = time.time() if now is None else now
+        with self.lock:
+            for e in events:
+                kind = KIND_CODES.get(e.kind)
+                if kind is not None:
+                    self._append(e.ts, kind, e.wire, e.duration)
+            self._expire(now)
+            if self.dead > COMPACT_MIN_STRINGS and self.dead * 2 > len(self.strings):
+                self._compact()
+
+    def _append(self, ts: float, kind: int, conn: Dict, duration: float = 0.0):
+        if self.head - self.tail == self.capacity:
+            self._evict(1)
+        # Keep ts sorted even if the wall clock steps back
+        ts = self.last_ts = max(ts, self.last_ts)
+        seq = self.head
+        pos = seq % self.capacity
+        cols = self.cols
+        row = {
+            "pid": conn["pid"],
+            "app": self._string(conn["app"]),
+            "ip": self._string(conn["ip"]),
+            "domain": self._string(conn["domain"]),
+            "host": self._string(conn.get("host")),
+        }
+        cols["ts"][pos] = ts
+        cols["duration"][pos] = duration
+        cols["port"][pos] = conn["port"]
+        cols["kind"][pos] = kind
+        cols["flags"][pos] = BROWSER if conn["type"] == "browser" else 0
+        cols["threat"][pos] = _threat(conn["is_threat"])
+        for name, value in row.items():
+            cols[name][pos] = value
+            if value == NO_STRING:
+                continue
+            postings = self.index[name].get(value)
+            if postings is None:
+                postings = self.index[name][value] = _Postings()
+            postings.seqs.append(seq)
+        self.head += 1
+
+    def _evict(self, n: int):
+        start = self.tail
+        positions = np.arange(start, start + n) % self.capacity
+        if self.spill:
+            rows = np.zeros(n, SPILL_DTYPE)
+            for name in COLUMNS:
+                if name in STRING_COLUMNS:
+                    rows[name] = self.spill.intern(self.cols[name][positions], self.strings)
+                else:
+                    rows[name] = self.cols[name][positions]
+            self.spill.append(rows)
+            self.spilled += n
+        refs = self.refs
+        for name in INDEXED:
+            index = self.index[name]
+            strings = name in STRING_COLUMNS
+            for value in self.cols[name][positions].tolist():
+                if value == NO_STRING:
+                    continue
+                postings = index[value]
+                postings.evict_oldest()
+                if not postings:
+                    del index[value]
+                if strings:
+                    refs[value] -= 1
+                    if not refs[value]:
+                        self.dead += 1
+        self.tail += n
+
+    def _expire(self, now: float):
+        cutoff = now - self.max_age
+        n = self._seq_at(cutoff) - self.tail
+        if n > 0:
+            self._evict(n)
+
+    def _seq_at(self, t: float, right: bool = False) -> int:
+        """First live seq with ts >= t (ts > t when right)"""
+        ts, cap = self.cols["ts"], self.capacity
+        lo, hi = self.tail, self.head
+        while lo < hi:
+            mid = (lo + hi) // 2
+            v = ts[mid % cap]
+            if v < t or (right and v == t):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None, pid: Optional[int] = None,
+              app: Optional[str] = None, ip: Optional[str] = None, domain: Optional[str] = None,
+              kind: Optional[str] = None, limit: int = MAX_RESULTS, host: Optional[str] = None) -> Dict:
+        """Events with since <= ts <= until matching every given field, the newest `limit` of them"""
+        since = float("-inf") if since is None else since
+        until = float("inf") if until is None else until
+        limit = max(1, min(limit, MAX_RESULTS))
+        wanted = {"pid": pid, "app": app, "ip": ip, "domain": domain, "host": host}
+        wanted = {k: v for k, v in wanted.items() if v is not None}
+        kind_code = KINDS.index(kind) if kind is not None else None
+
+        with self.lock:
+            ids = {k: (v if k == "pid" else self.string_ids.get(v, NO_STRING)) for k, v in wanted.items()}
+            oldest = float(self.cols["ts"][self.tail % self.capacity]) if self.head > self.tail else None
+            lo, hi = self._seq_at(since), self._seq_at(until, right=True)
+            if any(v == NO_STRING for v in ids.values()):
+                seqs = np.empty(0, np.int64)
+            elif ids:
+                # Walk the smallest posting list in range, check the other keys on the columns
+                postings = [self.index[k].get(v) for k, v in ids.items()]
+                seqs = np.asarray(
+                    min((p.between(lo, hi) for p in postings), key=len) if all(postings) else [], np.int64
+                )
+            else:
+                seqs = np.arange(lo, hi, dtype=np.int64)
+            positions = seqs % self.capacity
+            mask = np.ones(len(positions), bool)
+            for k, v in ids.items():
+                mask &= self.cols[k][positions] == v
+            if kind_code is not None:
+                mask &= self.cols["kind"][positions] == kind_code
+            positions = positions[mask]
+            total = len(positions)
+            memory = {name: col[positions[-limit:]] for name, col in self.cols.items()}
+
+            spilled = None
+            # Evicted events are no longer in memory, so the two parts never overlap
+            if self.spill and (oldest is None or since <= oldest):
+                rows = self.spill.between(since, until)
+                keep = np.ones(len(rows), bool)
+                for k, v in wanted.items():
+                    if k != "pid":
+                        # The file numbers its strings itself; a string it never saw matches nothing
+                        v = self.spill.string_ids.get(v)
+                        if v is None:
+                            keep[:] = False
+                            break
+                    keep &= rows[k] == v
+                if kind_code is not None:
+                    keep &= rows["kind"] == kind_code
+                rows = rows[keep]
+                total += len(rows)
+                room = limit - len(memory["ts"])
+                spilled = rows[max(0, len(rows) - room):] if room > 0 else None
+
+            events = []
+            if spilled is not None and len(spilled):
+                events += self._events({name: spilled[name] for name in COLUMNS}, self.spill.strings)
+            events += self._events(memory, self.strings)
+
+        return {"events": events, "matched": total, "truncated": total > len(events), "oldest": oldest}
+
+    def _events(self, cols: Dict[str, np.ndarray], strings: List[str]) -> List[Dict]:
+        out = []
+        for ts, duration, pid, port, app, ip, domain, host, kind, flags, threat in zip(*(cols[n].tolist() for n in COLUMNS)):
+            a, addr = strings[app], strings[ip]
+            d = strings[domain] if domain != NO_STRING else None
+            browser = bool(flags & BROWSER)
+            cid = f"{a}_{addr}_{port}" if browser else f"{a}_{pid}_{addr}_{port}"
+            event = {
+                "ts": round(ts, 3),
+                "event": KINDS[kind],
+                "id": f"{strings[host]}/{cid}" if host != NO_STRING else cid,
+                "app": a,
+                "pid": pid,
+                "ip": addr,
+                "port": port,
+                "type": "browser" if browser else "process",
+                "domain": d,
+                "is_threat": None if threat == PENDING else bool(threat),
+            }
+            if host != NO_STRING:
+                event["host"] = strings[host]
+            if kind != OPENED:
+                event["duration"] = round(duration, 3)
+            out.append(event)
+        return out
+
+    def metrics(self) -> Dict:
+        with self.lock:
+            live = self.head - self.tail
+            oldest = self.cols["ts"][self.tail % self.capacity] if live else None
+            return {
+                "events": live,
+                "capacity": self.capacity,
+                "oldest_age_s": round(time.time() - float(oldest), 1) if oldest is not None else None,
+                "strings": len(self.strings) - self.dead,
+                "index_keys": {name: len(index) for name, index in self.index.items()},
+                "spilled": self.spilled,
+            }
@@ -0,0 +1,188 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, 0.1 ms .. 2.5 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Sampling profiler
+PROFILE_INTERVAL = float(os.environ.get("SOLAR_PROFILE_INTERVAL", "0.005"))  # seconds between samples
+MAX_PROFILE_SECONDS = 60.0
+
+# (metric name suffix, label text, value)
+Sample = Tuple[str, str, float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in labels.items() if v is not None]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        # Unlabeled counters report 0 before the first increment
+        self.values: Dict[Optional[str], float] = {} if label else {None: 0}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, label: Optional[str] = None):
+        with self.lock:
+            self.values[label] = self.values.get(label, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        with self.lock:
+            values = list(self.values.items())
+        for label, value in values:
+            yield "", _labels(**{self.label: label}) if self.label else "", value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by one label"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> [per-bucket counts (+Inf last), sum, count]
+        self.series: Dict[Optional[str], list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, label: Optional[str] = None):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label)
+            if series is None:
+                series = self.series[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> Iterator[Sample]:
+        with self.lock:
+            series = [(label, list(counts), total, n) for label, (counts, total, n) in self.series.items()]
+        for label, counts, total, n in series:
+            named = {self.label: label} if self.label else {}
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                yield "_bucket", _labels(**named, le=_number(bound)), running
+            yield "_sum", _labels(**named), total
+            yield "_count", _labels(**named), n
+
+
+class Callback:
+    """Value read at scrape time from state another module already keeps"""
+
+    def __init__(self, name: str, help: str, fn: Callable, kind: str = "gauge", label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.label = label
+
+    def samples(self) -> Iterator[Sample]:
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if isinstance(value, dict):
+            for label, v in value.items():
+                yield "", _labels(**{self.label: label}), v
+        elif value is not None:
+            yield "", "", value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        # Re-registering a counter or histogram returns the existing one
+        existing = self.metrics.get(metric.name)
+        if existing is not None and not isinstance(metric, Callback):
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label: Optional[str] = None) -> Counter:
+        return self._add(Counter(name, help, label))
+
+    def histogram(self, name: str, help: str, label: Optional[str] = None, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, label, buckets))
+
+    def callback(self, name: str, help: str, fn: Callable, kind: str = "gauge", label: Optional[str] = None) -> Callback:
+        return self._add(Callback(name, help, fn, kind, label))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _idle(frame) -> bool:
+    # Pool threads block in the C-level queue get, so their innermost Python frame is the worker loop
+    code = frame.f_code
+    return code.co_name == "_worker" and code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py"))
+
+
+def sample_stacks(seconds: float, thread_prefix: str = "solar-scan", interval: float = PROFILE_INTERVAL) -> Tuple[_Tally, int]:
+    """Sample the stacks of matching threads for `seconds`; returns (collapsed stack -> samples, idle samples)"""
+    seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+    stacks = _Tally()
+    idle = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        targets = {t.ident for t in threading.enumerate() if t.name.startswith(thread_prefix)}
+        for ident, frame in sys._current_frames().items():
+            if ident not in targets:
+                continue
+            if _idle(frame):
+                idle += 1
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+        time.sleep(interval)
+    return stacks, idle
+
+
+def collapsed(stacks: _Tally) -> str:
+    """Brendan Gregg's collapsed format, one "frame;frame;frame count" line per stack (flamegraph.pl, speedscope)"""
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
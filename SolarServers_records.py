@@ -0,0 +1,81 @@
+import socket
+import sys
+from functools import lru_cache
+from typing import Dict, Optional
+
+# Marks packed IPv6 addresses so ::1 and 0.0.0.1 stay distinct
+_V6 = 1 << 128
+
+
+@lru_cache(maxsize=65536)
+def pack_ip(ip: str) -> int:
+    """Address string -> int (0 for a missing or unparsable address)"""
+    if not ip:
+        return 0
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        pass
+    try:
+        return _V6 | int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    except OSError:
+        return 0
+
+
+@lru_cache(maxsize=65536)
+def unpack_ip(value: int) -> str:
+    if value & _V6:
+        return socket.inet_ntop(socket.AF_INET6, (value ^ _V6).to_bytes(16, "big"))
+    return socket.inet_ntop(socket.AF_INET, value.to_bytes(4, "big"))
+
+
+class ConnRecord:
+    """One scanned connection inside the pipeline.
+
+    Slots instead of a dict, the app name interned, the address packed into an int.
+    The wire dict (and its id string) is only built by to_wire() when a packet is
+    serialized.
+    """
+
+    __slots__ = ("app", "pid", "ip", "port", "lport", "browser", "domain", "is_threat", "threat_score", "window")
+
+    def __init__(self, app: str, pid: int, ip: int, port: int, lport: int = 0, browser: bool = False, domain: Optional[str] = None):
+        self.app = sys.intern(app)
+        self.pid = pid
+        self.ip = ip
+        self.port = port
+        self.lport = lport
+        self.browser = browser
+        self.domain = domain
+        self.is_threat: Optional[bool] = False
+        # Model attack probability (1.0 for a blocklisted domain)
+        self.threat_score = 0.0
+        self.window: Optional[tuple] = None
+
+    @property
+    def ip_str(self) -> str:
+        return unpack_ip(self.ip) if self.ip else "0.0.0.0"
+
+    @property
+    def id(self) -> str:
+        # Browser sockets to one address share an id across the browser's processes.
+        # The domain is left out: it resolves in the background, and the id must not change when it does
+        if self.browser:
+            return f"{self.app}_{self.ip_str}_{self.port}"
+        return f"{self.app}_{self.pid}_{self.ip_str}_{self.port}"
+
+    def to_wire(self) -> Dict:
+        browser = self.browser
+        ip = unpack_ip(self.ip) if self.ip else "0.0.0.0"
+        return {
+            "id": f"{self.app}_{ip}_{self.port}" if browser else f"{self.app}_{self.pid}_{ip}_{self.port}",
+            "app": self.app,
+            "pid": self.pid,
+            "ip": ip,
+            "port": self.port,
+            "type": "browser" if browser else "process",
+            "domain": self.domain,
+            "is_threat": self.is_threat,
+            "risk_weight": 0.5 if browser else 1.0,
+            "threat_score": self.threat_score,
+        }
@@ -0,0 +1,247 @@
+import os
+import platform
+import socket
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Set
+
+import psutil as ps
+
+# SOLAR_SCANNER=auto|procnet|psutil
+SCANNER = os.environ.get("SOLAR_SCANNER", "auto")
+
+# One ESTABLISHED socket with a remote end
+Socket = namedtuple("Socket", "pid ip port lport status inode")
+
+# TCP only, like PsutilScanner: UDP sockets have no ESTABLISHED state there
+PROC_NET_TABLES = ("tcp", "tcp6")
+ESTABLISHED_HEX = "01"
+
+HIDDEN = "System/Hidden"
+
+
+class ProcessIndex:
+    """Incrementally maintained socket inode -> pid -> (name, create_time) index.
+
+    refresh() only reads processes that appeared since the last tick and evicts the
+    ones that exited. A pid is checked against its create time the first time it is
+    looked up in a tick, so a recycled pid never keeps the previous owner's name.
+    """
+
+    def __init__(self, root: str = "/proc"):
+        self.root = root
+        self.procs: Dict[int, tuple] = {}
+        self.inode_pids: Dict[str, int] = {}
+        self.pid_inodes: Dict[int, Set[str]] = {}
+        self.unresolved: Set[str] = set()
+        self.added: List[int] = []
+        self.validated: Set[int] = set()
+        self.stats = {"refresh_ms": 0.0, "added": 0, "evicted": 0, "revalidated": 0, "fd_scans": 0}
+
+    @staticmethod
+    def _read_proc(pid: int) -> tuple:
+        try:
+            p = ps.Process(pid)
+            with p.oneshot():
+                return p.name(), p.create_time()
+        except Exception:
+            return HIDDEN, None
+
+    def refresh(self, mapper=map):
+        start = time.perf_counter()
+        try:
+            current = set(ps.pids())
+        except Exception:
+            return
+        for pid in [pid for pid in self.procs if pid not in current]:
+            self._evict(pid)
+        self.added = [pid for pid in current if pid not in self.procs]
+        for pid, info in zip(self.added, mapper(self._read_proc, self.added)):
+            self.procs[pid] = info
+        self.validated.clear()
+        self.stats["added"] += len(self.added)
+        self.stats["refresh_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    def _evict(self, pid: int):
+        self.procs.pop(pid, None)
+        for inode in self.pid_inodes.pop(pid, ()):
+            if self.inode_pids.get(inode) == pid:
+                del self.inode_pids[inode]
+        self.stats["evicted"] += 1
+
+    def info(self, pid: int) -> tuple:
+        info = self.procs.get(pid)
+        if info is None:
+            info = self.procs[pid] = self._read_proc(pid)
+            self.validated.add(pid)
+        elif pid not in self.validated:
+            self.validated.add(pid)
+            try:
+                create_time = ps.Process(pid).create_time()
+            except Exception:
+                create_time = None
+            if create_time != info[1]:
+                self._evict(pid)
+                info = self.procs[pid] = self._read_proc(pid)
+                self.stats["revalidated"] += 1
+        return info
+
+    def name(self, pid: int) -> str:
+        return self.info(pid)[0]
+
+    def pid_for_inode(self, inode: str) -> Optional[int]:
+        return self.inode_pids.get(inode)
+
+    def _scan_fds(self, pid: int, wanted: Set[str]):
+        fd_dir = os.path.join(self.root, str(pid), "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            return
+        self.stats["fd_scans"] += 1
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if target.startswith("socket:["):
+                inode = target[8:-1]
+                if inode in wanted:
+                    self.inode_pids[inode] = pid
+                    self.pid_inodes.setdefault(pid, set()).add(inode)
+                    wanted.discard(inode)
+
+    def resolve_inodes(self, inodes: Set[str]):
+        """Find owners for unseen inodes: new pids first, then known socket owners, then the rest."""
+        wanted = {i for i in inodes if i not in self.inode_pids and i not in self.unresolved}
+        # Sockets we gave up on can only turn up in processes that appeared since
+        retry = {i for i in self.unresolved if i in inodes} if self.added else set()
+        if not wanted and not retry:
+            return
+        pending = wanted | retry
+        for pid in self.added:
+            self._scan_fds(pid, pending)
+            if not pending:
+                break
+        self.unresolved -= retry - pending
+        wanted &= pending
+        if not wanted:
+            return
+        owners = list(self.pid_inodes)
+        seen = set(self.added)
+        for group in (owners, list(self.procs)):
+            for pid in group:
+                if pid in seen:
+                    continue
+                seen.add(pid)
+                self._scan_fds(pid, wanted)
+                if not wanted:
+                    return
+        # Sockets of processes we cannot inspect; retried against new pids only
+        self.unresolved |= wanted
+
+    def retain_inodes(self, live: Set[str]):
+        for inode in [i for i in self.inode_pids if i not in live]:
+            pid = self.inode_pids.pop(inode)
+            owned = self.pid_inodes.get(pid)
+            if owned:
+                owned.discard(inode)
+                if not owned:
+                    del self.pid_inodes[pid]
+        self.unresolved &= live
+
+    def metrics(self) -> Dict:
+        return {"processes": len(self.procs), "inodes": len(self.inode_pids), "unresolved": len(self.unresolved), **self.stats}
+
+
+class PsutilScanner:
+    """Portable backend: psutil walks every process' fd table on each call."""
+
+    name = "psutil"
+
+    def scan(self, exclude_pid: int = 0) -> List[Socket]:
+        try:
+            connections = ps.net_connections(kind="inet")
+        except Exception:
+            return []
+
+        return [
+            Socket(c.pid, c.raddr.ip, c.raddr.port, c.laddr.port if c.laddr else 0, c.status, None)
+            for c in connections
+            if c.pid and c.raddr and c.pid != exclude_pid and c.status == "ESTABLISHED"
+        ]
+
+
+class ProcNetScanner:
+    """Linux backend: bulk-reads /proc/net/{tcp,tcp6}.
+
+    Rows are filtered on the state column before any address decoding, and
+    socket inodes are mapped to pids through the shared ProcessIndex.
+    """
+
+    name = "procnet"
+
+    def __init__(self, index: Optional[ProcessIndex] = None, root: str = "/proc"):
+        self.root = root
+        self.index = index or ProcessIndex(root)
+
+    @staticmethod
+    def available(root: str = "/proc") -> bool:
+        return platform.system() == "Linux" and os.access(os.path.join(root, "net", "tcp"), os.R_OK)
+
+    def _read_table(self, table: str) -> List[List[str]]:
+        try:
+            with open(os.path.join(self.root, "net", table), "rb") as f:
+                data = f.read().decode("ascii", "ignore")
+        except OSError:
+            return []
+        rows = []
+        for line in data.splitlines()[1:]:
+            fields = line.split()
+            # sl local rem st ... inode
+            if len(fields) > 9 and fields[3] == ESTABLISHED_HEX:
+                rows.append(fields)
+        return rows
+
+    @staticmethod
+    def _decode(addr: str):
+        host, port = addr.split(":")
+        raw = bytes.fromhex(host)
+        if len(raw) == 4:
+            ip = socket.inet_ntop(socket.AF_INET, raw[::-1])
+        else:
+            # Four host-endian 32-bit words
+            ip = socket.inet_ntop(socket.AF_INET6, b"".join(raw[i:i + 4][::-1] for i in range(0, 16, 4)))
+        return ip, int(port, 16)
+
+    def scan(self, exclude_pid: int = 0) -> List[Socket]:
+        rows = []
+        for table in PROC_NET_TABLES:
+            rows.extend(self._read_table(table))
+
+        live = {fields[9] for fields in rows}
+        live.discard("0")
+        self.index.resolve_inodes(live)
+        # Forget closed sockets so a recycled inode is looked up again
+        self.index.retain_inodes(live)
+
+        results = []
+        for fields in rows:
+            pid = self.index.pid_for_inode(fields[9])
+            if not pid or pid == exclude_pid:
+                continue
+            ip, port = self._decode(fields[2])
+            _, lport = self._decode(fields[1])
+            results.append(Socket(pid, ip, port, lport, "ESTABLISHED", fields[9]))
+        return results
+
+
+def select_scanner(name: Optional[str] = None, index: Optional[ProcessIndex] = None):
+    name = (name or SCANNER).lower()
+    if name == "psutil":
+        return PsutilScanner()
+    if name == "procnet" or (name == "auto" and ProcNetScanner.available()):
+        if ProcNetScanner.available():
+            return ProcNetScanner(index)
+        print("procnet scanner unavailable, using psutil")
+    return PsutilScanner()
@@ -1,24 +1,101 @@
-
 import asyncio
+import hmac
+import os
+import time
+from typing import Optional
 import psutil
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi import Body
+from fastapi import Body, Query
+from fastapi.responses import PlainTextResponse
 from SolarServers_core import SolarServersCore
+from SolarServers_filters import Subscription
+from SolarServers_fleet import AGENT_RESYNCS, AGENT_TOKEN, Fleet
+from SolarServers_history import KINDS, MAX_RESULTS, HistoryStore
+from SolarServers_metrics import CONTENT_TYPE, MAX_PROFILE_SECONDS, REGISTRY, collapsed, sample_stacks
+from SolarServers_stream import FORMATS, AdaptiveInterval, Broadcaster
+from SolarServers_wire import decode_binary
 
-core = SolarServersCore()
+# local: scan this machine. aggregator: scan nothing, merge what SolarServers_agent.py pushes to /agent
+MODE = os.environ.get("SOLAR_MODE", "local")
+fleet = Fleet() if MODE == "aggregator" else None
+core = SolarServersCore() if fleet is None else None
+# Whatever produces (packet, events) each tick
+source = fleet or core
+broadcaster = Broadcaster()
+history = HistoryStore()
+# Dedicated thread so a slow scan never blocks the event loop
+scan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solar-scan")
 
 INTERVAL = 0.2
+# Merging agent frames costs next to nothing, so an aggregator never backs off from the base rate
+pacer = AdaptiveInterval(INTERVAL, maximum=INTERVAL) if fleet else AdaptiveInterval(INTERVAL)
 
 last_packet = None
 
+def scan_tick():
+    # Runs in the scan thread, so history bookkeeping stays off the event loop
+    packet, events = source.scan()
+    history.record(events)
+    return packet, events
+
+# One sampling profile at a time
+profile_lock = asyncio.Lock()
+
+def _verdict_cache():
+    return core.ai.cache.stats() if core.ai else {}
+
+# Scrape-time views of state the modules already keep
+if core is not None:
+    REGISTRY.callback("solar_verdict_cache_hits_total", "Verdict cache hits", lambda: _verdict_cache().get("hits"), "counter")
+    REGISTRY.callback("solar_verdict_cache_misses_total", "Verdict cache misses", lambda: _verdict_cache().get("misses"), "counter")
+    REGISTRY.callback("solar_verdict_cache_hit_ratio", "Verdict cache hit rate since start", lambda: _verdict_cache().get("hit_rate"))
+    REGISTRY.callback("solar_dns_cache_hits_total", "Reverse DNS cache hits", lambda: core.resolver.metrics()["hits"], "counter")
+    REGISTRY.callback("solar_dns_cache_misses_total", "Reverse DNS cache misses", lambda: core.resolver.metrics()["misses"], "counter")
+    REGISTRY.callback("solar_dns_lookups_total", "Reverse DNS lookups issued", lambda: core.resolver.metrics()["lookups"], "counter")
+    REGISTRY.callback("solar_process_index_size", "Processes in the process index", lambda: core.procs.metrics()["processes"])
+    if core.flows is not None:
+        REGISTRY.callback("solar_flows_live", "Connections tracked by the flow aggregator", lambda: core.flows.metrics()["live"])
+else:
+    REGISTRY.callback("solar_agents_connected", "Agents connected to this aggregator", lambda: len(fleet.connected))
+    REGISTRY.callback("solar_fleet_connections", "Connections in the merged fleet view", lambda: len(fleet.conns))
+REGISTRY.callback("solar_scan_interval_seconds", "Current adaptive scan interval", lambda: pacer.interval)
+REGISTRY.callback("solar_scan_rate_hz", "Effective scans per second", lambda: pacer.metrics()["effective_hz"])
+REGISTRY.callback("solar_ws_subscribers", "Connected WebSocket subscribers", lambda: len(broadcaster.subscribers))
+REGISTRY.callback("solar_delta_bytes_saved_total", "Bytes the delta protocol saved vs. full packets", lambda: broadcaster.stats.full_bytes - broadcaster.stats.sent_bytes, "counter")
+
+async def scan_loop():
+    # Single producer: one scan per tick, fanned out to every subscriber
+    global last_packet
+    loop = asyncio.get_running_loop()
+    while True:
+        start = time.perf_counter()
+        churn = 0
+        try:
+            last_packet, events = await loop.run_in_executor(scan_executor, scan_tick)
+            # Deltas come straight from the core's events instead of a diff of the whole table
+            churn = broadcaster.publish(last_packet, events).churn
+        except Exception as e:
+            print("Error scanning core:", e)
+
+        await asyncio.sleep(pacer.update(time.perf_counter() - start, churn))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("SolarServers server online")
-    print(f"Admin mode: {core.meta.get('is_admin', False)}")
+    print(f"SolarServers server online ({MODE})")
+    print(f"Admin mode: {source.meta.get('is_admin', False)}")
+    scanner = asyncio.create_task(scan_loop())
     yield
     # Shutdown
+    scanner.cancel()
+    try:
+        await scanner
+    except asyncio.CancelledError:
+        pass
+    scan_executor.shutdown(wait=False, cancel_futures=True)
+    source.shutdown()
     print("SolarServers server shutting")
 
 app = FastAPI(lifespan=lifespan)
@@ -27,34 +104,181 @@ app = FastAPI(lifespan=lifespan)
 def root():
     return {"status": "Server alive"}
 
+async def receive_commands(ws: WebSocket, sub):
+    # Client -> server messages; {"type": "resync"} asks for a fresh snapshot,
+    # {"type": "subscribe", "filter": {...}, "limit": K} narrows what is sent
+    while True:
+        msg = await ws.receive_json()
+        if not isinstance(msg, dict):
+            continue
+        if msg.get("type") == "resync":
+            broadcaster.resync(sub)
+        elif msg.get("type") == "subscribe":
+            try:
+                subscription = Subscription.from_message(msg)
+            except ValueError as e:
+                await ws.close(code=1008, reason=str(e))
+                # Raised, not returned, so the send loop stops too
+                raise WebSocketDisconnect(code=1008, reason=str(e))
+            broadcaster.set_subscription(sub, subscription)
+            print(f"WS client subscribed: {subscription!r}")
+
 @app.websocket("/ws")
-async def websocket_stream(ws: WebSocket):
+async def websocket_stream(ws: WebSocket, delta: bool = False, format: str = "json"):
+    if format not in FORMATS:
+        await ws.close(code=1003, reason=f"format must be one of {', '.join(FORMATS)}")
+        return
     await ws.accept()
-    print("WS client connected")
+    print(f"WS client connected ({'delta' if delta else 'full'}, {format})")
+    sub = broadcaster.subscribe(delta=delta, fmt=format)
+    receiver = asyncio.create_task(receive_commands(ws, sub))
 
     try:
         while True:
-            try:
-                global last_packet
-                last_packet = core.get_packet()
-                await ws.send_json(last_packet)
-                print(f"Sent packet with {len(last_packet['connections'])} connections")
-            except Exception as e:
-                print("Error scanning core:", e)
+            # Always the latest state; ticks the client was too slow for are coalesced.
+            # Raced against the receiver, so a close or bad command ends the loop at once
+            # instead of at the next frame, which a quiet filtered view may never send
+            pending = asyncio.ensure_future(sub.next())
+            await asyncio.wait((pending, receiver), return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                pending.cancel()
+                receiver.result()
                 break
-
-            await asyncio.sleep(INTERVAL)
+            frame = pending.result()
+            # Encoded once per tick and shared by every subscriber of the same format
+            if format == "binary":
+                await ws.send_bytes(frame.binary())
+            else:
+                await ws.send_text(frame.json())
+            # Counted in /metrics; no per-frame logging on the hot path
+            broadcaster.sent(sub, frame)
     except WebSocketDisconnect:
         print("WS client disconnected")
     except Exception as e:
         print("Error:", e)
+    finally:
+        receiver.cancel()
+        broadcaster.unsubscribe(sub)
+
+@app.websocket("/agent")
+async def agent_stream(ws: WebSocket):
+    # Aggregator mode: one persistent connection per agent, deflated binary snapshot/delta frames
+    if fleet is None:
+        await ws.close(code=1008, reason="not an aggregator (start with SOLAR_MODE=aggregator)")
+        return
+    host = ws.headers.get("x-solar-host", "")
+    if AGENT_TOKEN and not hmac.compare_digest(ws.headers.get("x-solar-token", ""), AGENT_TOKEN):
+        refused = "invalid token"
+    else:
+        refused = fleet.connect(host)
+    if refused:
+        # Closing before accept rejects the handshake (HTTP 403), so the reason is only logged here
+        print(f"Agent {host!r} refused: {refused}")
+        await ws.close(code=1008, reason=refused)
+        return
+    await ws.accept()
+    print(f"Agent {host} connected")
+    # Last applied seq; None until a snapshot arrives
+    seq = None
+    awaiting_snapshot = False
+    try:
+        while True:
+            data = await ws.receive_bytes()
+            try:
+                # Inflating and unpacking a frame is the per-agent hot path; keep it off the event loop
+                frame = await asyncio.to_thread(decode_binary, data)
+            except Exception:
+                await ws.close(code=1003, reason="expected a binary snapshot or delta frame")
+                return
+            if frame.get("type") == "snapshot":
+                seq, awaiting_snapshot = frame["seq"], False
+            elif frame.get("type") == "delta" and seq is not None and frame.get("base") == seq:
+                seq = frame["seq"]
+            else:
+                # A gap: drop deltas until the snapshot asked for here arrives
+                if not awaiting_snapshot:
+                    awaiting_snapshot = True
+                    AGENT_RESYNCS.inc()
+                    await ws.send_json({"type": "resync"})
+                seq = None
+                continue
+            fleet.receive(host, frame, len(data))
+    except WebSocketDisconnect:
+        print(f"Agent {host} disconnected")
+    except Exception as e:
+        print(f"Agent {host} error:", e)
+    finally:
+        fleet.disconnect(host)
 
 @app.get("/debug")
 def debug():
-    return core.get_packet()
+    if last_packet is None:
+        return {"status": "No scan yet"}
+    return last_packet
+
+@app.get("/stats")
+def stats():
+    shared = {
+        "protocol": broadcaster.stats.summary(),
+        "subscriptions": broadcaster.metrics(),
+        "history": history.metrics(),
+        "rate": pacer.metrics(),
+    }
+    if fleet is not None:
+        return {"mode": MODE, "stage_ms": fleet.stage_timings, "fleet": fleet.metrics(), **shared}
+    return {
+        "mode": MODE,
+        "startup_ms": core.startup_timings,
+        "ai": core.ai_state,
+        "stage_ms": core.stage_timings,
+        "process_index": core.procs.metrics(),
+        **({"flows": core.flows.metrics()} if core.flows is not None else {}),
+        "dns": core.resolver.metrics(),
+        **shared,
+    }
+
+@app.get("/history")
+def history_query(
+    pid: Optional[int] = None,
+    app_name: Optional[str] = Query(None, alias="app"),
+    ip: Optional[str] = None,
+    domain: Optional[str] = None,
+    host: Optional[str] = None,
+    event: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    last: Optional[float] = None,
+    limit: int = 1000,
+):
+    # Connection events in a time range (epoch seconds, or the `last` N seconds), newest `limit` of them
+    if event is not None and event not in KINDS:
+        return {"error": f"event must be one of {', '.join(KINDS)}"}
+    if last is not None:
+        since = time.time() - last
+    return history.query(since, until, pid=pid, app=app_name, ip=ip, domain=domain, kind=event, limit=min(limit, MAX_RESULTS), host=host)
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/profile")
+async def profile(seconds: float = 5.0, threads: str = "solar-scan"):
+    # Sampling profile of the scan thread (or other threads by name prefix) in collapsed-stack format
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return PlainTextResponse(f"seconds must be in (0, {MAX_PROFILE_SECONDS:g}]\n", status_code=400)
+    if profile_lock.locked():
+        return PlainTextResponse("a profile is already running\n", status_code=409)
+    async with profile_lock:
+        stacks, idle = await asyncio.to_thread(sample_stacks, seconds, threads)
+    return PlainTextResponse(collapsed(stacks), headers={
+        "X-Profile-Samples": str(sum(stacks.values())),
+        "X-Profile-Idle-Samples": str(idle),
+    })
 
 @app.post("/kill")
 def kill_process(pid: int = Body(..., embed = True)):
+    if core is None:
+        return {"error": "Not available on an aggregator"}
     if not core.meta.get("is_admin", False):
         return {"error": "Permissions not sufficient"}
     try:
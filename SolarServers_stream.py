@@ -0,0 +1,420 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Union
+
+from SolarServers_events import CLOSED, OPENED, ConnEvent
+from SolarServers_filters import ALL, Subscription
+from SolarServers_metrics import REGISTRY
+from SolarServers_wire import encode_binary, encode_json
+
+# Ticks between full snapshots on the delta protocol (5 s at 0.2 s per tick)
+KEYFRAME_EVERY = 25
+STATS_WINDOW = 10.0  # seconds
+
+# Adaptive scan interval bounds (seconds)
+MIN_INTERVAL = 0.1
+MAX_INTERVAL = 1.0
+# Share of the interval a scan may take before the interval backs off
+SCAN_BUDGET = 0.5
+# Changed connections per tick that count as high churn
+HIGH_CHURN = 5
+IDLE_BACKOFF = 1.25
+
+# Wire formats a subscriber can ask for
+FORMATS = ("json", "binary")
+
+FRAME_ENCODE_SECONDS = REGISTRY.histogram("solar_frame_encode_seconds", "Time to serialize one frame (once per tick per format)", label="format")
+FRAMES_SENT = REGISTRY.counter("solar_frames_sent_total", "WebSocket frames sent", label="format")
+FRAME_BYTES_SENT = REGISTRY.counter("solar_frame_bytes_sent_total", "WebSocket payload bytes sent", label="format")
+FRAMES_COALESCED = REGISTRY.counter("solar_frames_coalesced_total", "Ticks a slow subscriber never received because a newer frame replaced them")
+
+
+class Frame:
+    """One outgoing message. Each encoding is produced at most once, then shared by every subscriber."""
+
+    __slots__ = ("data", "_json", "_binary")
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self._json = None
+        self._binary = None
+
+    @property
+    def type(self) -> str:
+        return self.data.get("type", "packet")
+
+    def json(self) -> str:
+        if self._json is None:
+            t = time.perf_counter()
+            self._json = encode_json(self.data)
+            FRAME_ENCODE_SECONDS.observe(time.perf_counter() - t, "json")
+        return self._json
+
+    def binary(self) -> bytes:
+        if self._binary is None:
+            t = time.perf_counter()
+            self._binary = encode_binary(self.data)
+            FRAME_ENCODE_SECONDS.observe(time.perf_counter() - t, "binary")
+        return self._binary
+
+    def encoded(self, fmt: str) -> Union[str, bytes]:
+        return self.binary() if fmt == "binary" else self.json()
+
+
+class Tick:
+    """Everything published for one scan: the legacy packet plus its delta-protocol frames."""
+
+    __slots__ = ("packet", "snapshot", "delta", "churn")
+
+    def __init__(self, packet: Frame, snapshot: Frame, delta: Frame, churn: int = 0):
+        self.packet = packet
+        self.snapshot = snapshot
+        self.delta = delta
+        self.churn = churn
+
+
+def merge_deltas(first: Dict, second: Dict) -> Dict:
+    """One delta frame equivalent to applying `first` and then `second`"""
+    added = {c["id"]: c for c in first["added"]}
+    updated = {c["id"]: c for c in first["updated"]}
+    removed = dict.fromkeys(first["removed"])
+    for i in second["removed"]:
+        if added.pop(i, None) is None:
+            updated.pop(i, None)
+            removed[i] = None
+    for c in second["added"]:
+        if c["id"] in removed:
+            # Gone and back again: the client still has the old version
+            del removed[c["id"]]
+            updated[c["id"]] = c
+        else:
+            added[c["id"]] = c
+    for c in second["updated"]:
+        (added if c["id"] in added else updated)[c["id"]] = c
+    return {
+        "type": "delta",
+        "base": first["base"],
+        "seq": second["seq"],
+        "meta": second["meta"],
+        "added": list(added.values()),
+        "updated": list(updated.values()),
+        "removed": list(removed),
+    }
+
+
+class DeltaEncoder:
+    """Turns consecutive packets into sequence-numbered added/updated/removed frames.
+
+    Fed the core's connection events, a delta costs as much as the churn; without
+    them it falls back to diffing against the previous packet. An encoder gets
+    events on every tick or on none.
+    """
+
+    def __init__(self, keyframe_every: int = KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.prev: Dict[str, Dict] = {}
+        self.seq = 0
+
+    def _diff(self, packet: Dict) -> tuple:
+        current = {c["id"]: c for c in packet["connections"]}
+        prev = self.prev
+        self.prev = current
+        return (
+            [c for i, c in current.items() if i not in prev],
+            [c for i, c in current.items() if i in prev and prev[i] != c],
+            [i for i in prev if i not in current],
+        )
+
+    @staticmethod
+    def _from_events(events: List[ConnEvent]) -> tuple:
+        added, updated, removed = [], [], []
+        for e in events:
+            if e.kind == CLOSED:
+                removed.append(e.id)
+            elif e.kind == OPENED:
+                added.append(e.wire)
+            else:
+                updated.append(e.wire)
+        return added, updated, removed
+
+    def encode(self, packet: Dict, events: Optional[List[ConnEvent]] = None) -> Tick:
+        self.seq += 1
+        snapshot = {
+            "type": "snapshot",
+            "seq": self.seq,
+            "meta": packet["meta"],
+            "connections": packet["connections"],
+        }
+
+        added, updated, removed = self._diff(packet) if events is None else self._from_events(events)
+        delta = {
+            "type": "delta",
+            # seq this delta applies on top of; merged deltas span several ticks
+            "base": self.seq - 1,
+            "seq": self.seq,
+            "meta": packet["meta"],
+            "added": added,
+            "updated": updated,
+            "removed": removed,
+        }
+        churn = len(added) + len(updated) + len(removed)
+        snapshot_frame = Frame(snapshot)
+        keyframe = self.seq % self.keyframe_every == 0
+        return Tick(Frame(packet), snapshot_frame, snapshot_frame if keyframe else Frame(delta), churn)
+
+
+class ProtocolStats:
+    """Rolling bytes sent vs. what full packets would have cost."""
+
+    def __init__(self, window: float = STATS_WINDOW):
+        self.window = window
+        self.samples = deque()
+        self.full_bytes = 0
+        self.sent_bytes = 0
+        self.delta_frames = 0
+        self.keyframes = 0
+        self.resyncs = 0
+        self.coalesced = 0
+
+    def record(self, full: int, sent: int):
+        now = time.monotonic()
+        self.samples.append((now, full - sent))
+        self.full_bytes += full
+        self.sent_bytes += sent
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def summary(self) -> Dict:
+        now = time.monotonic()
+        saved = sum(s for t, s in self.samples if now - t <= self.window)
+        return {
+            "delta_frames": self.delta_frames,
+            "keyframes": self.keyframes,
+            "resyncs": self.resyncs,
+            "coalesced": self.coalesced,
+            "full_bytes": self.full_bytes,
+            "sent_bytes": self.sent_bytes,
+            "bytes_saved": self.full_bytes - self.sent_bytes,
+            "bytes_saved_per_sec": round(saved / self.window, 1),
+        }
+
+
+class Subscriber:
+    """One connected dashboard with a single-frame mailbox.
+
+    A tick replaces whatever the client has not picked up yet, so a slow client
+    gets the latest state instead of a backlog: full packets are replaced, pending
+    deltas are merged into one that spans both ticks.
+    """
+
+    def __init__(self, delta: bool = False, fmt: str = "json"):
+        self.delta = delta
+        self.format = fmt
+        self.pending: Optional[Frame] = None
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+        self.subscription = ALL
+        # Delta subscribers always start from a snapshot
+        self.needs_snapshot = delta
+
+    def _set(self, frame: Frame) -> Frame:
+        if self.pending is not None:
+            self.coalesced += 1
+        self.pending = frame
+        self.ready.set()
+        return frame
+
+    def offer(self, tick: Tick) -> Frame:
+        if not self.delta:
+            return self._set(tick.packet)
+        if self.needs_snapshot:
+            return self.resync(tick)
+        pending = self.pending
+        if pending is None or tick.delta.type == "snapshot":
+            return self._set(tick.delta)
+        if pending.type == "snapshot":
+            # The newer snapshot supersedes the unsent one
+            return self._set(tick.snapshot)
+        return self._set(Frame(merge_deltas(pending.data, tick.delta.data)))
+
+    def resync(self, tick: Tick) -> Frame:
+        """Replace anything pending with a fresh snapshot"""
+        self.needs_snapshot = False
+        return self._set(tick.snapshot)
+
+    async def next(self) -> Frame:
+        """Wait for and take the pending frame"""
+        await self.ready.wait()
+        self.ready.clear()
+        frame, self.pending = self.pending, None
+        return frame
+
+
+class AdaptiveInterval:
+    """Scan pacing: backs off when a scan runs over budget or nothing changed, speeds up under churn."""
+
+    def __init__(self, base: float, minimum: float = MIN_INTERVAL, maximum: float = MAX_INTERVAL,
+                 budget: float = SCAN_BUDGET, high_churn: int = HIGH_CHURN, window: float = STATS_WINDOW):
+        self.base = base
+        self.minimum = min(minimum, base)
+        self.maximum = max(maximum, base)
+        self.budget = budget
+        self.high_churn = high_churn
+        self.window = window
+        self.interval = base
+        self.ticks = deque()
+        self.last = {"scan_ms": 0.0, "churn": 0, "reason": "base"}
+
+    def update(self, scan_seconds: float, churn: int) -> float:
+        """Record one tick; returns how long to sleep before the next scan"""
+        # A scan may take at most `budget` of the interval
+        floor = scan_seconds / self.budget
+        if floor > self.interval:
+            self.interval, reason = min(self.maximum, max(self.interval * 2, floor)), "over_budget"
+        elif churn == 0:
+            self.interval, reason = min(self.maximum, self.interval * IDLE_BACKOFF), "idle"
+        elif churn >= self.high_churn:
+            self.interval, reason = max(self.minimum, self.interval / 2, floor), "churn"
+        else:
+            # Ease back toward the base rate
+            self.interval, reason = max(floor, self.interval + (self.base - self.interval) / 2), "steady"
+
+        now = time.monotonic()
+        self.ticks.append(now)
+        while self.ticks and now - self.ticks[0] > self.window:
+            self.ticks.popleft()
+        self.last = {"scan_ms": round(scan_seconds * 1000, 3), "churn": churn, "reason": reason}
+        return max(0.0, self.interval - scan_seconds)
+
+    def metrics(self) -> Dict:
+        span = self.ticks[-1] - self.ticks[0] if len(self.ticks) > 1 else 0.0
+        return {
+            "interval_ms": round(self.interval * 1000, 1),
+            "effective_hz": round((len(self.ticks) - 1) / span, 2) if span else 0.0,
+            **self.last,
+        }
+
+
+class View:
+    """The stream for one distinct subscription: its filtered packets and their delta state."""
+
+    __slots__ = ("subscription", "encoder", "latest", "snapshot_bytes")
+
+    def __init__(self, subscription: Subscription):
+        self.subscription = subscription
+        self.encoder = DeltaEncoder()
+        self.latest: Optional[Tick] = None
+        # Size of the last snapshot actually sent, per format: the baseline for bytes saved
+        self.snapshot_bytes: Dict[str, int] = {}
+
+    def update(self, packet: Dict, events: Optional[List[ConnEvent]] = None) -> Tick:
+        # Events describe the unfiltered stream, so filtered views diff their own packets
+        if self.subscription.filtered:
+            events = None
+        self.latest = self.encoder.encode(self.subscription.apply(packet), events)
+        return self.latest
+
+
+class Broadcaster:
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.stats = ProtocolStats()
+        # The unfiltered view always runs: its churn drives the scan interval
+        self.views: Dict[Subscription, View] = {ALL: View(ALL)}
+        self.packet: Optional[Dict] = None
+
+    @property
+    def latest(self) -> Optional[Tick]:
+        return self.views[ALL].latest
+
+    def _view(self, subscription: Subscription, prime: bool = True) -> View:
+        view = self.views.get(subscription)
+        if view is None:
+            view = self.views[subscription] = View(subscription)
+            # Encode the last packet so a new subscription has state before the next tick
+            if prime and self.packet is not None:
+                view.update(self.packet)
+        return view
+
+    def _deliver(self, sub: Subscriber, tick: Optional[Tick]):
+        if tick is None:
+            return
+        if sub.delta:
+            sub.resync(tick)
+        else:
+            sub.offer(tick)
+
+    def subscribe(self, delta: bool = False, fmt: str = "json") -> Subscriber:
+        sub = Subscriber(delta=delta, fmt=fmt)
+        self._deliver(sub, self.latest)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    def set_subscription(self, sub: Subscriber, subscription: Subscription):
+        """Switch a subscriber to another filter; it gets the new view's current state right away"""
+        if subscription == sub.subscription:
+            return
+        sub.subscription = subscription
+        self._deliver(sub, self._view(subscription).latest)
+
+    def resync(self, sub: Subscriber):
+        tick = self._view(sub.subscription).latest
+        if tick is not None and sub.delta:
+            self.stats.resyncs += 1
+            sub.resync(tick)
+
+    def publish(self, packet: Dict, events: Optional[List[ConnEvent]] = None) -> Tick:
+        self.packet = packet
+        groups: Dict[Subscription, list] = {}
+        for sub in self.subscribers:
+            groups.setdefault(sub.subscription, []).append(sub)
+        for subscription in [s for s in self.views if s not in groups and s is not ALL]:
+            del self.views[subscription]
+
+        tick = self.views[ALL].update(packet, events)
+        for subscription, subs in groups.items():
+            # Filtered once per tick per distinct subscription, shared by all its subscribers
+            view_tick = tick if subscription == ALL else self._view(subscription, prime=False).update(packet)
+            counted = False
+            for sub in subs:
+                if sub.pending is not None:
+                    self.stats.coalesced += 1
+                    FRAMES_COALESCED.inc()
+                sub.offer(view_tick)
+                if sub.delta and not counted:
+                    counted = True
+                    if view_tick.delta is view_tick.snapshot:
+                        self.stats.keyframes += 1
+                    else:
+                        self.stats.delta_frames += 1
+        return tick
+
+    def sent(self, sub: Subscriber, frame: Frame):
+        """Account a frame the subscriber actually received"""
+        # Frames cache their encodings, so this never serializes a second time
+        size = len(frame.encoded(sub.format))
+        FRAMES_SENT.inc(1, sub.format)
+        FRAME_BYTES_SENT.inc(size, sub.format)
+        if not sub.delta:
+            return
+        view = self.views.get(sub.subscription)
+        if frame.type == "snapshot":
+            self.stats.record(size, size)
+            if view is not None:
+                view.snapshot_bytes[sub.format] = size
+            return
+        # Never encodes a snapshot just for this counter: every delta subscriber got one
+        # on subscribe, and keyframes refresh the size every KEYFRAME_EVERY ticks
+        full = view.snapshot_bytes.get(sub.format) if view is not None else None
+        if full is not None:
+            self.stats.record(full, size)
+
+    def metrics(self) -> Dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "views": {repr(s): sum(sub.subscription == s for sub in self.subscribers) for s in self.views},
+        }
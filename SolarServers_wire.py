@@ -0,0 +1,159 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List
+
+# Binary frames above this size are deflated; smaller ones are not worth the CPU
+COMPRESS_MIN_BYTES = 16 * 1024
+COMPRESS_LEVEL = 1
+
+MAGIC = b"SB"
+VERSION = 3
+FLAG_DEFLATE = 1
+
+# Per-connection flag bits
+BROWSER = 1
+THREAT = 2
+PENDING = 4  # is_threat is null while the model loads
+
+NO_DOMAIN = -1
+
+# Sections holding connection lists, per frame type
+SECTIONS = ("connections", "added", "updated")
+
+
+def encode_json(frame: Dict) -> str:
+    # Same separators as Starlette's send_json
+    return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+
+def _column(typecode: str, values) -> bytes:
+    col = array(typecode, values)
+    if sys.byteorder != "little":
+        col.byteswap()
+    return col.tobytes()
+
+
+def _pad4(data: bytes) -> bytes:
+    return data + b" " * (-len(data) % 4)
+
+
+def encode_binary(frame: Dict, compress_min: int = COMPRESS_MIN_BYTES) -> bytes:
+    """Columnar binary frame; decoded by decodeBinaryFrame in frontend/main.js.
+
+    Layout (little-endian, every column 4-byte aligned):
+      "SB" u8 version u8 flags | body, deflated (zlib) when FLAG_DEFLATE is set
+      body: u32 header length, JSON header (type, seq, meta, removed, string table,
+            section sizes) padded to 4 bytes, then per section the columns
+            pid u32, port u32, app u32, ip u32 (string indexes), domain i32 (-1 = null),
+            risk_weight f32, threat_score f32, flags u8 padded to 4 bytes, and when the header has
+            "hosts" (aggregator frames) host u32
+    Connection ids are not sent: the client rebuilds them with the same rule as
+    ConnRecord.id, prefixed with "<host>/" on aggregator frames.
+    """
+    strings: List[str] = []
+    index: Dict[str, int] = {}
+
+    def ref(s):
+        i = index.get(s)
+        if i is None:
+            i = index[s] = len(strings)
+            strings.append(s)
+        return i
+
+    header = {k: v for k, v in frame.items() if k not in SECTIONS}
+    # Aggregated connections carry the agent's host name (SolarServers_fleet.py)
+    hosts = any(conns and "host" in conns[0] for conns in (frame.get(name) for name in SECTIONS))
+    if hosts:
+        header["hosts"] = True
+    sections = []
+    columns = []
+    for name in SECTIONS:
+        conns = frame.get(name)
+        if conns is None:
+            continue
+        sections.append([name, len(conns)])
+        columns += [
+            _column("I", [c["pid"] for c in conns]),
+            _column("I", [c["port"] for c in conns]),
+            _column("I", [ref(c["app"]) for c in conns]),
+            _column("I", [ref(c["ip"]) for c in conns]),
+            _column("i", [ref(c["domain"]) if c["domain"] else NO_DOMAIN for c in conns]),
+            _column("f", [c["risk_weight"] for c in conns]),
+            _column("f", [c.get("threat_score", 0.0) for c in conns]),
+            _pad4(bytes(
+                (BROWSER if c["type"] == "browser" else 0)
+                | (PENDING if c["is_threat"] is None else THREAT if c["is_threat"] else 0)
+                for c in conns
+            )),
+        ]
+        if hosts:
+            columns.append(_column("I", [ref(c["host"]) for c in conns]))
+    header["sections"] = sections
+    header["strings"] = strings
+    head = _pad4(encode_json(header).encode())
+    body = b"".join([struct.pack("<I", len(head)), head, *columns])
+
+    flags = 0
+    if len(body) >= compress_min:
+        packed = zlib.compress(body, COMPRESS_LEVEL)
+        if len(packed) < len(body):
+            body, flags = packed, FLAG_DEFLATE
+    return MAGIC + bytes((VERSION, flags)) + body
+
+
+def decode_binary(data: bytes) -> Dict:
+    """Inverse of encode_binary, for tests and tools"""
+    if data[:2] != MAGIC:
+        raise ValueError("not a binary frame")
+    body = data[4:]
+    if data[3] & FLAG_DEFLATE:
+        body = zlib.decompress(body)
+    (head_len,) = struct.unpack_from("<I", body)
+    frame = json.loads(body[4:4 + head_len])
+    strings = frame.pop("strings")
+    hosts = frame.pop("hosts", False)
+    offset = 4 + head_len
+
+    def take(typecode, n, size):
+        nonlocal offset
+        col = array(typecode, body[offset:offset + n * size])
+        if sys.byteorder != "little":
+            col.byteswap()
+        offset += n * size
+        return col
+
+    for name, n in frame.pop("sections"):
+        pid, port, app, ip = (take("I", n, 4) for _ in range(4))
+        domain = take("i", n, 4)
+        risk = take("f", n, 4)
+        score = take("f", n, 4)
+        flags = body[offset:offset + n]
+        offset += n + (-n % 4)
+        host = take("I", n, 4) if hosts else None
+        conns = []
+        for i in range(n):
+            browser = bool(flags[i] & BROWSER)
+            d = strings[domain[i]] if domain[i] != NO_DOMAIN else None
+            a, addr = strings[app[i]], strings[ip[i]]
+            cid = f"{a}_{addr}_{port[i]}" if browser else f"{a}_{pid[i]}_{addr}_{port[i]}"
+            conn = {
+                "id": f"{strings[host[i]]}/{cid}" if hosts else cid,
+                "app": a,
+                "pid": pid[i],
+                "ip": addr,
+                "port": port[i],
+                "type": "browser" if browser else "process",
+                "domain": d,
+                "is_threat": None if flags[i] & PENDING else bool(flags[i] & THREAT),
+                "risk_weight": risk[i],
+                # f32 on the wire, back to the 3 decimals it was sent with
+                "threat_score": round(score[i], 3),
+            }
+            if hosts:
+                conn["host"] = strings[host[i]]
+            conns.append(conn)
+        frame[name] = conns
+    return frame
@@ -0,0 +1,36 @@
+"""
+Command-line demo of the threat engine: URL pattern checks and port checks.
+Run: python ai_demo.py
+"""
+
+from ai_engine import get_engine
+
+def main():
+    e = get_engine()
+    test_urls = [
+        "https://bopsecrets.org/rexroth/cr/1.htm",
+        "yourbittorrent.com",
+        "https://google.com",
+        "https://github.com",
+        "https://malware.ru",
+        "https://hack.cn",
+        "crackwarez.xyz",
+        "torrentdownload.site",
+        "freekeygen.top",
+        "warezdownload.club",
+        "http://www.824555.com/app/member/SportOption.php?uid=guest&langx=gb"
+    ]
+
+    print("URL Threat Detection Test:")
+    for url in test_urls:
+        domain = url.split('/')[2] if '//' in url else url.split('/')[0] if '/' in url else url
+        is_threat = e.check_url_threat(domain)
+        print(f"{domain}: {'THREAT' if is_threat else 'SAFE'}")
+
+    print("\nPort Tests:")
+    print(f"Port 443: {'THREAT' if e.predict_threat('', 443) else 'SAFE'}")
+    print(f"Port 4444: {'THREAT' if e.predict_threat('', 4444) else 'SAFE'}")
+    print(f"Port 6666: {'THREAT' if e.predict_threat('', 6666) else 'SAFE'}")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,148 @@
-import joblib
 import os
 import numpy as np
-import pandas as pd
-import re
+import threading
+import time
 import warnings
+from collections import OrderedDict
+from domain_matcher import DomainMatcher
+from SolarServers_flows import WINDOW_FEATURES
 warnings.filterwarnings("ignore", message=".*sklearn.utils.parallel.delayed.*")
+
+# NSL-KDD feature order the scaler and selector were fitted on
+FEATURE_COLUMNS = [
+    'duration', 'protocol_type', 'service', 'flag', 'src_bytes', 'dst_bytes',
+    'land', 'wrong_fragment', 'urgent', 'hot', 'num_failed_logins', 'logged_in',
+    'num_compromised', 'root_shell', 'su_attempted', 'num_root',
+    'num_file_creations', 'num_shells', 'num_access_files', 'num_outbound_cmds',
+    'is_host_login', 'is_guest_login', 'count', 'srv_count', 'serror_rate',
+    'srv_serror_rate', 'rerror_rate', 'srv_rerror_rate', 'same_srv_rate',
+    'diff_srv_rate', 'srv_diff_host_rate', 'dst_host_count', 'dst_host_srv_count',
+    'dst_host_same_srv_rate', 'dst_host_diff_srv_rate',
+    'dst_host_same_src_port_rate', 'dst_host_srv_diff_host_rate',
+    'dst_host_serror_rate', 'dst_host_srv_serror_rate', 'dst_host_rerror_rate',
+    'dst_host_srv_rerror_rate'
+]
+
+# Values for fields we cannot observe from a socket table
+DEFAULT_FEATURES = {
+    'duration': 0,
+    'protocol_type': 'tcp',  # Assume TCP
+    'service': 'private',
+    'flag': 'SF',
+    'src_bytes': 1000,  # Default
+    'dst_bytes': 5000,  # Default
+    'land': 0,
+    'wrong_fragment': 0,
+    'urgent': 0,
+    'hot': 0,
+    'num_failed_logins': 0,
+    'logged_in': 0,
+    'num_compromised': 0,
+    'root_shell': 0,
+    'su_attempted': 0,
+    'num_root': 0,
+    'num_file_creations': 0,
+    'num_shells': 0,
+    'num_access_files': 0,
+    'num_outbound_cmds': 0,
+    'is_host_login': 0,
+    'is_guest_login': 0,
+    'count': 10,
+    'srv_count': 10,
+    'serror_rate': 0.0,
+    'srv_serror_rate': 0.0,
+    'rerror_rate': 0.0,
+    'srv_rerror_rate': 0.0,
+    'same_srv_rate': 1.0,
+    'diff_srv_rate': 0.0,
+    'srv_diff_host_rate': 0.0,
+    'dst_host_count': 1,
+    'dst_host_srv_count': 1,
+    'dst_host_same_srv_rate': 1.0,
+    'dst_host_diff_srv_rate': 0.0,
+    'dst_host_same_src_port_rate': 1.0,
+    'dst_host_srv_diff_host_rate': 0.0,
+    'dst_host_serror_rate': 0.0,
+    'dst_host_srv_serror_rate': 0.0,
+    'dst_host_rerror_rate': 0.0,
+    'dst_host_srv_rerror_rate': 0.0
+}
+
+WEB_PORTS = (80, 443)
+
+COL = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+WINDOW_COLS = [COL[name] for name in WINDOW_FEATURES]
+# Windows are snapped to this grid before they key the cache and reach the model:
+# counts to steps of 5, rates to tenths, so near-identical windows share one entry
+WINDOW_STEPS = [5.0 if name.endswith('count') else 0.1 for name in WINDOW_FEATURES]
+
+VERDICT_CACHE_SIZE = 4096
+VERDICT_CACHE_TTL = 300.0  # seconds
+
+# SOLAR_AI_BACKEND=auto|compiled|sklearn; auto uses the compiled artifact when it is newer than the pickle
+AI_BACKEND = os.environ.get("SOLAR_AI_BACKEND", "auto")
+MODEL_PATH = "SolarServer_model.pkl"
+COMPILED_PATH = "SolarServer_model_compiled.npz"
+
+# Extra blocklist files (one domain per line or hosts format), separated by os.pathsep
+BLOCKLISTS = [p for p in os.environ.get("SOLAR_BLOCKLIST", "").split(os.pathsep) if p]
+
+def quantize_window(window):
+    """WINDOW_FEATURES values snapped to WINDOW_STEPS"""
+    return tuple(round(round(v / step) * step, 1) for v, step in zip(window, WINDOW_STEPS))
+
+class VerdictCache:
+    """Bounded LRU of (verdict, score) keyed on the inputs that actually vary"""
+
+    def __init__(self, maxsize=VERDICT_CACHE_SIZE, ttl=VERDICT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, now):
+        item = self.entries.get(key)
+        if item is None or now - item[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key, value, now):
+        self.entries[key] = (now, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
 class AIEngine:
-    def __init__(self):
+    def __init__(self, backend=AI_BACKEND):
+        self.backend = backend
+        self.backend_in_use = None
         self.model = None
         self.sc = None
         self.encoders = {}
         self.selector = None
+        self.templates = None
+        self.codes = {}
+        self.cache = VerdictCache()
+        self.lock = threading.Lock()
         # Known malicious patterns - expanded
         self.malicious_patterns = [
             # Suspicious TLDs
@@ -32,8 +164,52 @@ class AIEngine:
             r'bit\.ly', r'tinyurl', r'goo\.gl',
             r'pastebin', r'githubusercontent',
         ]
-        if os.path.exists("SolarServer_model.pkl"):
-            self.model = joblib.load("SolarServer_model.pkl")
+        self.matcher = DomainMatcher(self.malicious_patterns)
+        for path in BLOCKLISTS:
+            self.load_blocklist(path)
+        self.load_models()
+
+    def load_models(self):
+        """(Re)load the model files, rebuild the templates and drop cached verdicts"""
+        with self.lock:
+            self.model = None
+            self.sc = None
+            self.selector = None
+            self.encoders = {}
+            self.backend_in_use = None
+            if self._use_compiled():
+                from forest_compiler import load
+                self.model, self.sc, self.encoders = load(COMPILED_PATH)
+                self.selector = None  # folded into the compiled preprocessor
+                self.backend_in_use = "compiled"
+                print("AI Engine: Online (compiled)")
+            else:
+                self._load_sklearn()
+            self.codes = {}
+            self.templates = self._build_templates() if self.model else None
+            self.cache.clear()
+
+    reload = load_models
+
+    def _use_compiled(self):
+        if self.backend == "sklearn" or not os.path.exists(COMPILED_PATH):
+            if self.backend == "compiled":
+                print(f"AI Engine: {COMPILED_PATH} not found, using sklearn")
+            return False
+        if self.backend == "auto" and os.path.exists(MODEL_PATH):
+            # The artifact records the hash of the pickle it came from; any other pickle was retrained since
+            from forest_compiler import file_digest, source_digest
+            if source_digest(COMPILED_PATH) != file_digest(MODEL_PATH):
+                print(f"AI Engine: {COMPILED_PATH} was not exported from this {MODEL_PATH}, using sklearn")
+                return False
+        return True
+
+    def _load_sklearn(self):
+        import joblib  # pulls in sklearn on first load, keep it off the import path
+
+        if os.path.exists(MODEL_PATH):
+            self.model = joblib.load(MODEL_PATH)
+            self.backend_in_use = "sklearn"
             print("AI Engine: Online")
         else:
             print("AI Engine: Offline")
@@ -46,175 +222,178 @@ class AIEngine:
     
     def check_url_threat(self, url):
         """Check if URL contains suspicious patterns"""
+        return self.match_url_rule(url) is not None
+
+    def match_url_rule(self, url):
+        """Return the malicious pattern or blocklist entry the URL matched, or None"""
         if not url:
-            return False
-        
-        url_lower = url.lower()
-        for pattern in self.malicious_patterns:
-            if re.search(pattern, url_lower):
-                return True
-        return False
-    
-    def predict_threat(self, ip, port, status="ESTABLISHED", domain=None):
-        if not self.model:
-            return False
-        
-        # First check URL/domain patterns
-        if domain and self.check_url_threat(domain):
-            return True  # Known malicious pattern
-        
-        # Create feature dict with defaults
-        features = {
-            'duration': 0,
-            'protocol_type': 'tcp',  # Assume TCP
-            'service': 'http' if port in [80, 443] else 'private',  # Guess service
-            'flag': 'SF' if status == 'ESTABLISHED' else 'S0',  # Assume SF for established
-            'src_bytes': 1000,  # Default
-            'dst_bytes': 5000,  # Default
-            'land': 0,
-            'wrong_fragment': 0,
-            'urgent': 0,
-            'hot': 0,
-            'num_failed_logins': 0,
-            'logged_in': 1 if port in [80, 443] else 0,  # Assume logged in for web
-            'num_compromised': 0,
-            'root_shell': 0,
-            'su_attempted': 0,
-            'num_root': 0,
-            'num_file_creations': 0,
-            'num_shells': 0,
-            'num_access_files': 0,
-            'num_outbound_cmds': 0,
-            'is_host_login': 0,
-            'is_guest_login': 0,
-            'count': 10,
-            'srv_count': 10,
-            'serror_rate': 0.0,
-            'srv_serror_rate': 0.0,
-            'rerror_rate': 0.0,
-            'srv_rerror_rate': 0.0,
-            'same_srv_rate': 1.0,
-            'diff_srv_rate': 0.0,
-            'srv_diff_host_rate': 0.0,
-            'dst_host_count': 1,
-            'dst_host_srv_count': 1,
-            'dst_host_same_srv_rate': 1.0,
-            'dst_host_diff_srv_rate': 0.0,
-            'dst_host_same_src_port_rate': 1.0,
-            'dst_host_srv_diff_host_rate': 0.0,
-            'dst_host_serror_rate': 0.0,
-            'dst_host_srv_serror_rate': 0.0,
-            'dst_host_rerror_rate': 0.0,
-            'dst_host_srv_rerror_rate': 0.0
-        }
-        
-        # Preprocess
-        df_sample = pd.DataFrame([features])
-        for col, enc in self.encoders.items():
-            if col in df_sample.columns:
-                df_sample[col] = enc.transform(df_sample[col])
-        X_sample = df_sample.values
+            return None
+        return self.matcher.match(url)
+
+    def load_blocklist(self, path):
+        try:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                lines = f.readlines()
+        except OSError as e:
+            print(f"AI Engine: blocklist {path} not loaded: {e}")
+            return 0
+        # Scoring reads the matcher under the same lock
+        with self.lock:
+            added = self.matcher.add_blocklist(lines, label=path)
+            self.cache.clear()
+        print(f"AI Engine: {added} blocklist entries from {path}")
+        return added
+
+    def _encode(self, col, value):
+        enc = self.encoders.get(col)
+        if enc is None:
+            return value
+        return enc.transform([value])[0]
+
+    def encode_values(self, col, values):
+        """Vectorized _encode for a whole column; unseen labels get the default value's code"""
+        enc = self.encoders.get(col)
+        if enc is None:
+            return np.asarray(values, dtype=np.float64)
+        index = self.codes.get(col)
+        if index is None:
+            index = self.codes[col] = {label: i for i, label in enumerate(enc.classes_.tolist())}
+        fallback = index.get(DEFAULT_FEATURES[col], 0)
+        return np.array([index.get(v, fallback) for v in values], dtype=np.float64)
+
+    def _feature_matrix(self, ports, statuses):
+        """Build the raw (n, 41) feature matrix for a batch of sockets"""
+        ports = np.asarray(ports)
+        is_web = np.isin(ports, WEB_PORTS)
+        established = np.array([status == 'ESTABLISHED' for status in statuses], dtype=bool)
+
+        base = np.array(
+            [self._encode(col, DEFAULT_FEATURES[col]) for col in FEATURE_COLUMNS],
+            dtype=np.float64
+        )
+        X = np.tile(base, (len(ports), 1))
+        X[:, COL['service']] = np.where(is_web, self._encode('service', 'http'), self._encode('service', 'private'))
+        X[:, COL['flag']] = np.where(established, self._encode('flag', 'SF'), self._encode('flag', 'S0'))
+        X[:, COL['logged_in']] = is_web
+        return X
+
+    def _transform(self, X):
         if self.sc:
-            X_sample = self.sc.transform(X_sample)
+            X = self.sc.transform(X)
         if self.selector:
-            X_sample = self.selector.transform(X_sample)
-        pred = self.model.predict(X_sample)[0]
-        return pred == 0  # 0 is attack
-    
-    def get_threat_score(self, ip, port, status="ESTABLISHED", domain=None):
+            X = self.selector.transform(X)
+        return X
+
+    def _build_templates(self):
+        """Scaled and selected vectors for every (is_web, established) combination.
+
+        Every other feature is a constant, so these four rows are all the model ever sees.
+        """
+        X = self._feature_matrix([0, 0, 80, 80], ['SYN_SENT', 'ESTABLISHED'] * 2)
+        return self._transform(X).reshape(2, 2, -1)
+
+    def _score_rows(self, conns):
+        """(verdicts, scores) for (ip, port, status, domain[, window]) rows, served from the cache where possible.
+
+        `window` is an optional tuple of WINDOW_FEATURES values; rows without one use
+        the DEFAULT_FEATURES traffic statistics.
+        """
+        conns = list(conns)
+        verdicts = np.zeros(len(conns), dtype=bool)
+        scores = np.zeros(len(conns))
         if not self.model:
-            return 0.0
-        
-        # URL pattern check
-        if domain and self.check_url_threat(domain):
-            return 1.0  # Maximum threat score
-        
-        # Similar to predict_threat
-        features = {
-            'duration': 0,
-            'protocol_type': 'tcp',
-            'service': 'http' if port in [80, 443] else 'private',
-            'flag': 'SF' if status == 'ESTABLISHED' else 'S0',
-            'src_bytes': 1000,
-            'dst_bytes': 5000,
-            'land': 0,
-            'wrong_fragment': 0,
-            'urgent': 0,
-            'hot': 0,
-            'num_failed_logins': 0,
-            'logged_in': 1 if port in [80, 443] else 0,
-            'num_compromised': 0,
-            'root_shell': 0,
-            'su_attempted': 0,
-            'num_root': 0,
-            'num_file_creations': 0,
-            'num_shells': 0,
-            'num_access_files': 0,
-            'num_outbound_cmds': 0,
-            'is_host_login': 0,
-            'is_guest_login': 0,
-            'count': 10,
-            'srv_count': 10,
-            'serror_rate': 0.0,
-            'srv_serror_rate': 0.0,
-            'rerror_rate': 0.0,
-            'srv_rerror_rate': 0.0,
-            'same_srv_rate': 1.0,
-            'diff_srv_rate': 0.0,
-            'srv_diff_host_rate': 0.0,
-            'dst_host_count': 1,
-            'dst_host_srv_count': 1,
-            'dst_host_same_srv_rate': 1.0,
-            'dst_host_diff_srv_rate': 0.0,
-            'dst_host_same_src_port_rate': 1.0,
-            'dst_host_srv_diff_host_rate': 0.0,
-            'dst_host_serror_rate': 0.0,
-            'dst_host_srv_serror_rate': 0.0,
-            'dst_host_rerror_rate': 0.0,
-            'dst_host_srv_rerror_rate': 0.0
-        }
-        
-        df_sample = pd.DataFrame([features])
-        for col, enc in self.encoders.items():
-            if col in df_sample.columns:
-                df_sample[col] = enc.transform(df_sample[col])
-        X_sample = df_sample.values
-        if self.sc:
-            X_sample = self.sc.transform(X_sample)
-        if self.selector:
-            X_sample = self.selector.transform(X_sample)
-        if hasattr(self.model, 'predict_proba'):
-            prob = self.model.predict_proba(X_sample)[0]
-            return float(prob[0])  # Probability of attack
-        else:
-            return 0.0
-    
-    def get_stats(self):
-        return {"model_loaded": self.model is not None}
-
-e = AIEngine()
-test_urls = [
-    "https://bopsecrets.org/rexroth/cr/1.htm",
-    "yourbittorrent.com",
-    "https://google.com",
-    "https://github.com",
-    "https://malware.ru",
-    "https://hack.cn",
-    "crackwarez.xyz",
-    "torrentdownload.site",
-    "freekeygen.top",
-    "warezdownload.club",
-    "http://www.824555.com/app/member/SportOption.php?uid=guest&langx=gb"
-]
+            return verdicts, scores
+
+        with self.lock:
+            now = time.monotonic()
+            pending = {}
+            for i, (_, port, status, domain, *window) in enumerate(conns):
+                key = (port, status, domain, quantize_window(window[0]) if window and window[0] else None)
+                hit = self.cache.get(key, now)
+                if hit is None:
+                    pending.setdefault(key, []).append(i)
+                else:
+                    verdicts[i], scores[i] = hit
+            if not pending:
+                return verdicts, scores
+
+            keys = list(pending)
+            key_verdicts = np.array([bool(domain) and self.check_url_threat(domain) for _, _, domain, _ in keys], dtype=bool)
+            key_scores = np.where(key_verdicts, 1.0, 0.0)  # URL match is maximum threat score
+            rest = np.flatnonzero(~key_verdicts)
+            if len(rest):
+                X = self._rows_matrix([keys[i] for i in rest])
+                if hasattr(self.model, 'predict_proba'):
+                    prob = self.model.predict_proba(X)
+                    key_verdicts[rest] = self.model.classes_[prob.argmax(axis=1)] == 0  # 0 is attack
+                    attack = list(self.model.classes_).index(0)  # 0 is attack
+                    key_scores[rest] = prob[:, attack]  # Probability of attack
+                else:
+                    key_verdicts[rest] = self.model.predict(X) == 0
+
+            for key, verdict, score in zip(keys, key_verdicts, key_scores):
+                self.cache.put(key, (bool(verdict), float(score)), now)
+                verdicts[pending[key]] = verdict
+                scores[pending[key]] = score
+        return verdicts, scores
+
+    def _rows_matrix(self, keys):
+        """Model input for (port, status, domain, window) keys: templates, or a real transform when windows are known"""
+        windowed = [i for i, key in enumerate(keys) if key[3] is not None]
+        if not windowed:
+            is_web = np.isin([key[0] for key in keys], WEB_PORTS).astype(int)
+            established = np.array([key[1] == 'ESTABLISHED' for key in keys], dtype=int)
+            return self.templates[is_web, established]
+        X = self._feature_matrix([key[0] for key in keys], [key[1] for key in keys])
+        X[np.ix_(windowed, WINDOW_COLS)] = [keys[i][3] for i in windowed]
+        return self._transform(X)
+
+    def score_matrix(self, X):
+        """(verdicts, attack probabilities) for raw, already encoded (n, 41) NSL-KDD rows"""
+        with self.lock:
+            model, sc, selector = self.model, self.sc, self.selector
+        n = len(X)
+        if not model:
+            return np.zeros(n, dtype=bool), np.zeros(n)
+        if sc:
+            X = sc.transform(X)
+        if selector:
+            X = selector.transform(X)
+        if not hasattr(model, 'predict_proba'):
+            verdicts = model.predict(X) == 0
+            return verdicts, verdicts.astype(float)
+        prob = model.predict_proba(X)
+        attack = list(model.classes_).index(0)  # 0 is attack
+        return model.classes_[prob.argmax(axis=1)] == 0, prob[:, attack]
+
+    def predict_threat_batch(self, conns):
+        """Score all (ip, port, status, domain[, window]) rows of one scan in a single model pass"""
+        return self._score_rows(conns)[0].tolist()
 
-print("URL Threat Detection Test:")
-for url in test_urls:
-    domain = url.split('/')[2] if '//' in url else url.split('/')[0] if '/' in url else url
-    is_threat = e.check_url_threat(domain)
-    print(f"{domain}: {'THREAT' if is_threat else 'SAFE'}")
+    def classify_batch(self, conns):
+        """(verdicts, attack scores) for (ip, port, status, domain[, window]) rows, from one model pass"""
+        verdicts, scores = self._score_rows(conns)
+        return verdicts.tolist(), scores.tolist()
+
+    def get_threat_scores_batch(self, conns):
+        return self._score_rows(conns)[1].tolist()
+
+    def predict_threat(self, ip, port, status="ESTABLISHED", domain=None):
+        return self.predict_threat_batch([(ip, port, status, domain)])[0]
+
+    def get_threat_score(self, ip, port, status="ESTABLISHED", domain=None):
+        return self.get_threat_scores_batch([(ip, port, status, domain)])[0]
+
+    def get_stats(self):
+        return {"model_loaded": self.model is not None, "backend": self.backend_in_use, "verdict_cache": self.cache.stats()}
 
-print("\nPort Tests:")
-print(f"Port 443: {'THREAT' if e.predict_threat('', 443) else 'SAFE'}")
-print(f"Port 4444: {'THREAT' if e.predict_threat('', 4444) else 'SAFE'}")
-print(f"Port 6666: {'THREAT' if e.predict_threat('', 6666) else 'SAFE'}")
+_engine = None
+_engine_lock = threading.Lock()
 
+def get_engine():
+    """Process-wide AIEngine, constructed (and the model files loaded) on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AIEngine()
+        return _engine
@@ -0,0 +1,214 @@
+"""
+Offline threat scoring for recorded connection logs.
+
+  python batch_score.py KDDTest+.txt -o verdicts.csv
+  python batch_score.py connections.jsonl -o verdicts.jsonl --workers 4
+
+Input is read in fixed-size chunks, so memory stays flat whatever the file size:
+  - NSL-KDD rows (41 features, optionally followed by label and difficulty)
+  - JSONL, one object per line: any NSL-KDD feature names, and/or the live fields
+    port / status / domain; missing features take the same defaults as live scans
+
+Chunks are scored with the vectorized model path, in worker processes when
+--workers > 0, and verdicts are written in input order as soon as they are ready.
+Throughput is reported at the end, plus accuracy when the input carries labels.
+"""
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ai_engine import DEFAULT_FEATURES, FEATURE_COLUMNS, WEB_PORTS, AIEngine
+
+CHUNK_ROWS = 4096
+# Chunks in flight per worker; bounds memory while keeping the pool busy
+PREFETCH = 2
+
+CATEGORICAL = ('protocol_type', 'service', 'flag')
+
+_engine = None
+
+
+def _load_engine(backend):
+    # Keep the engine's status lines out of verdicts written to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return AIEngine(backend)
+
+
+def _init_worker(backend):
+    global _engine
+    _engine = _load_engine(backend)
+
+
+def _kdd_chunks(path, chunk_rows):
+    import pandas as pd
+    with open(path) as f:
+        width = len(next(csv.reader(f), []))
+    names = FEATURE_COLUMNS + ['label', 'difficulty'][:max(0, width - len(FEATURE_COLUMNS))]
+    for df in pd.read_csv(path, names=names, header=None, chunksize=chunk_rows):
+        columns = {col: df[col].tolist() for col in FEATURE_COLUMNS}
+        labels = (df['label'] != 'normal').tolist() if 'label' in df else None
+        yield columns, labels, [None] * len(df)
+
+
+def _jsonl_records(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _jsonl_chunks(path, chunk_rows):
+    records = _jsonl_records(path)
+    while True:
+        chunk = list(itertools.islice(records, chunk_rows))
+        if not chunk:
+            return
+        columns = {col: [] for col in FEATURE_COLUMNS}
+        for record in chunk:
+            features = dict(DEFAULT_FEATURES)
+            port = record.get('port')
+            if port is not None:
+                # Same mapping as the live templates
+                is_web = port in WEB_PORTS
+                features['service'] = 'http' if is_web else 'private'
+                features['logged_in'] = int(is_web)
+            if record.get('status') is not None:
+                features['flag'] = 'SF' if record['status'] == 'ESTABLISHED' else 'S0'
+            features.update((k, v) for k, v in record.items() if k in features)
+            for col in FEATURE_COLUMNS:
+                columns[col].append(features[col])
+        labels = [_label(r) for r in chunk]
+        yield columns, (labels if any(l is not None for l in labels) else None), [r.get('domain') for r in chunk]
+
+
+def _label(record):
+    """True for attack, False for normal, None when the record is unlabeled"""
+    if 'is_threat' in record:
+        return bool(record['is_threat'])
+    if 'label' in record:
+        return record['label'] != 'normal'
+    return None
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yields (columns, labels, domains) per chunk"""
+    if path.endswith(('.jsonl', '.json', '.ndjson')):
+        return _jsonl_chunks(path, chunk_rows)
+    return _kdd_chunks(path, chunk_rows)
+
+
+def score_chunk(chunk, engine=None):
+    """(verdicts, scores, labels) for one chunk"""
+    engine = engine or _engine
+    columns, labels, domains = chunk
+    X = np.column_stack([
+        engine.encode_values(col, columns[col]) if col in CATEGORICAL
+        else np.asarray(columns[col], dtype=np.float64)
+        for col in FEATURE_COLUMNS
+    ])
+    verdicts, scores = engine.score_matrix(X)
+    for i, domain in enumerate(domains):
+        if domain and engine.check_url_threat(domain):
+            verdicts[i], scores[i] = True, 1.0  # URL match is maximum threat score
+    return verdicts, scores, labels
+
+
+def _scored(chunks, workers, backend):
+    """Scored chunks in input order, with at most PREFETCH chunks per worker in flight"""
+    if workers <= 0:
+        engine = _load_engine(backend)
+        for chunk in chunks:
+            yield score_chunk(chunk, engine)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk))
+            if len(pending) >= workers * PREFETCH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class _Writer:
+    def __init__(self, out, fmt):
+        self.out = out
+        self.fmt = fmt
+        self.csv = None
+        if fmt == 'csv':
+            self.csv = csv.writer(out, lineterminator='\n')
+            self.csv.writerow(['row', 'is_threat', 'score', 'label_is_threat'])
+
+    def write(self, start, verdicts, scores, labels):
+        labels = labels if labels is not None else [None] * len(verdicts)
+        if self.csv:
+            self.csv.writerows(
+                (start + i, int(v), f"{s:.6f}", '' if l is None else int(l))
+                for i, (v, s, l) in enumerate(zip(verdicts.tolist(), scores.tolist(), labels))
+            )
+        else:
+            self.out.writelines(
+                json.dumps({"row": start + i, "is_threat": v, "score": round(s, 6), "label_is_threat": l}) + "\n"
+                for i, (v, s, l) in enumerate(zip(verdicts.tolist(), scores.tolist(), labels))
+            )
+
+
+def run(path, output=None, workers=0, chunk_rows=CHUNK_ROWS, backend=None):
+    fmt = 'jsonl' if output and output.endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+    out = open(output, 'w', newline='') if output else sys.stdout
+    writer = _Writer(out, fmt)
+    backend = backend or os.environ.get("SOLAR_AI_BACKEND", "auto")
+
+    start = time.perf_counter()
+    rows = labeled = correct = threats = 0
+    try:
+        for verdicts, scores, labels in _scored(read_chunks(path, chunk_rows), workers, backend):
+            writer.write(rows, verdicts, scores, labels)
+            rows += len(verdicts)
+            threats += int(verdicts.sum())
+            if labels is not None:
+                known = [(v, l) for v, l in zip(verdicts.tolist(), labels) if l is not None]
+                labeled += len(known)
+                correct += sum(v == l for v, l in known)
+    finally:
+        if output:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "rows": rows,
+        "threats": threats,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed) if elapsed else 0,
+    }
+    if labeled:
+        report["labeled"] = labeled
+        report["accuracy"] = round(correct / labeled, 4)
+    print(" | ".join(f"{k} {v}" for k, v in report.items()), file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a recorded connection log with the threat model")
+    parser.add_argument("input", help="NSL-KDD text file or JSONL connection log")
+    parser.add_argument("-o", "--output", help="verdicts file (.csv or .jsonl); stdout when omitted")
+    parser.add_argument("--workers", type=int, default=0, help="scoring processes, 0 scores in this process")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--backend", choices=["auto", "compiled", "sklearn"], help="defaults to SOLAR_AI_BACKEND")
+    args = parser.parse_args()
+    run(args.input, args.output, args.workers, args.chunk_rows, args.backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Fleet benchmark: many agents pushing to one aggregator on this machine.
+
+  python benchmarks/bench_fleet.py --agents 200 --seconds 30 -o fleet.json
+
+Starts an aggregator (uvicorn, SOLAR_MODE=aggregator) on a free port, then
+--procs worker processes that each run their share of the agents in one event
+loop, every agent scanning its own SyntheticHost (benchmarks/synthetic.py) at
+the normal 5 Hz and pushing over its own connection. AI is off, so only the
+transport and the merge are measured. Reported: frames and bytes the
+aggregator received per second, its CPU share, merge time per tick, publish
+rate, and how many scans behind the merged view is per host at the end.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import FakeProcessIndex, FakeScanner, StubResolver, SyntheticHost  # noqa: E402
+
+AGENTS = 100
+# Few changes per scan, so agents stay at the base rate instead of speeding up under churn
+ROWS = 100
+CHURN = 0.02
+SECONDS = 20.0
+STARTUP_SECONDS = 30.0
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str):
+    with urllib.request.urlopen(url, timeout=10) as r:
+        return json.load(r)
+
+
+def start_aggregator(port: int) -> subprocess.Popen:
+    env = dict(os.environ, SOLAR_MODE="aggregator")
+    cmd = [sys.executable, "-m", "uvicorn", "SolarServers_server:app", "--port", str(port),
+           "--ws-per-message-deflate", "false", "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            _get(f"http://127.0.0.1:{port}/")
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("aggregator did not start")
+
+
+def run_agents(names, url, args, stop, results):
+    """Worker process: one event loop, one scan thread, len(names) agents, until `stop` is set"""
+    from concurrent.futures import ThreadPoolExecutor
+    from SolarServers_agent import Agent
+    from SolarServers_core import SolarServersCore
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solar-scan")
+    agents = []
+    # Agent and core status lines would bury the report
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for i, name in enumerate(names):
+            host = SyntheticHost(args.rows, args.churn, seed=args.seed + i)
+            core = SolarServersCore(io_threads=1, resolver=StubResolver(host), ai_load="off")
+            core.procs = FakeProcessIndex(host)
+            core.scanner = FakeScanner(host)
+            agents.append(Agent(core, url, name, batch=args.batch, executor=executor))
+
+        async def main():
+            tasks = [asyncio.create_task(a.run()) for a in agents]
+            start = time.monotonic()
+            while not stop.is_set():
+                await asyncio.sleep(0.2)
+            for t in tasks:
+                t.cancel()
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(main())
+    results.put({a.host: {"seq": a.encoder.seq, "elapsed": elapsed, **a.stats} for a in agents})
+    for a in agents:
+        a.core.shutdown()
+    executor.shutdown(wait=False)
+
+
+def run(args):
+    import psutil
+
+    port = _free_port()
+    aggregator = start_aggregator(port)
+    base = f"http://127.0.0.1:{port}"
+    results = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    names = [f"agent-{i:04d}" for i in range(args.agents)]
+    workers = [
+        multiprocessing.Process(target=run_agents, args=(names[p::args.procs], f"ws://127.0.0.1:{port}/agent", args, stop, results))
+        for p in range(args.procs)
+    ]
+    try:
+        for w in workers:
+            w.start()
+        # Let every agent connect and send its snapshot before measuring
+        deadline = time.monotonic() + STARTUP_SECONDS + args.agents * 0.1
+        while _get(f"{base}/stats")["fleet"]["connected"] < args.agents and time.monotonic() < deadline:
+            time.sleep(0.5)
+        time.sleep(1)
+        proc = psutil.Process(aggregator.pid)
+        before = _get(f"{base}/stats")["fleet"]
+        proc.cpu_percent(None)
+        t = time.monotonic()
+        merge_ms = []
+        while time.monotonic() - t < args.seconds:
+            time.sleep(1)
+            merge_ms.append(_get(f"{base}/stats")["stage_ms"]["merge"])
+        elapsed = time.monotonic() - t
+        cpu = proc.cpu_percent(None)
+        stats = _get(f"{base}/stats")
+        after = stats["fleet"]
+        stop.set()
+
+        agent_stats = {}
+        for _ in workers:
+            agent_stats.update(results.get(timeout=60))
+        for w in workers:
+            w.join(timeout=30)
+    finally:
+        for w in workers:
+            if w.is_alive():
+                w.kill()
+        aggregator.terminate()
+        aggregator.wait(timeout=30)
+
+    def total(key, fleet):
+        return sum(h[key] for h in fleet["hosts"].values())
+
+    # Agents are stopped after the last /stats read, so their final seq can only be ahead
+    behind = sorted(agent_stats[h]["seq"] - m["seq"] for h, m in after["hosts"].items() if h in agent_stats)
+    merge_ms.sort()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "config": {
+            "agents": args.agents, "procs": args.procs, "rows": args.rows, "churn": args.churn,
+            "batch": args.batch, "seconds": args.seconds, "seed": args.seed,
+        },
+        "results": {
+            "agents_connected": after["connected"],
+            "connections": after["connections"],
+            "frames_per_sec": round((total("frames", after) - total("frames", before)) / elapsed, 1),
+            "kbytes_per_sec": round((total("bytes", after) - total("bytes", before)) / elapsed / 1024, 1),
+            "scans_per_sec": round(sum(a["seq"] / a["elapsed"] for a in agent_stats.values()), 1),
+            "aggregator_cpu_percent": round(cpu, 1),
+            "merge_ms_p50": merge_ms[len(merge_ms) // 2] if merge_ms else None,
+            "merge_ms_max": merge_ms[-1] if merge_ms else None,
+            "publish_hz": stats["rate"]["effective_hz"],
+            "resyncs": sum(a["resyncs"] for a in agent_stats.values()),
+            "scans_behind_p50": behind[len(behind) // 2] if behind else None,
+            "scans_behind_max": behind[-1] if behind else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Many synthetic agents against one local aggregator")
+    parser.add_argument("--agents", type=int, default=AGENTS)
+    parser.add_argument("--procs", type=int, default=max(1, min(8, (os.cpu_count() or 2) - 1)), help="agent worker processes")
+    parser.add_argument("--rows", type=int, default=ROWS, help="sockets per synthetic host")
+    parser.add_argument("--churn", type=float, default=CHURN, help="share of sockets replaced per scan")
+    parser.add_argument("--batch", type=float, default=0.5, help="agent batch window in seconds")
+    parser.add_argument("--seconds", type=float, default=SECONDS, help="measurement window")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    text = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Dict entries vs. ConnRecord on a synthetic connection table.
+
+  python benchmarks/bench_records.py [rows]
+
+"dict" is the pipeline as it was: one 9-key dict with its id string per socket,
+built during the scan. "records" builds ConnRecords during the scan and only turns
+them into wire dicts at the packet boundary. Reports build time, retained memory
+and allocations for the pipeline stage, and the end-to-end time including the wire
+conversion and json.dumps.
+"""
+
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SolarServers_records import ConnRecord, pack_ip  # noqa: E402
+
+Socket = namedtuple("Socket", "pid ip port lport status inode")
+BROWSERS = ["chrome.exe", "firefox.exe", "msedge.exe", "brave.exe", "opera.exe"]
+APPS = BROWSERS + ["python.exe", "code.exe", "slack.exe", "spotify.exe", "discord.exe", "node.exe"]
+REPEAT = 20
+
+
+def synthetic_table(rows, seed=42):
+    rng = random.Random(seed)
+    pids = {pid: rng.choice(APPS) for pid in range(1000, 1200)}
+    hosts = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(rows // 4 or 1)]
+    hosts += [f"2001:db8::{i + 1:x}" for i in range(rows // 20 or 1)]
+    domains = {ip: rng.choice(["example.com", "github.com", None]) for ip in hosts}
+    sockets = [
+        Socket(pid, rng.choice(hosts), rng.choice([443, 443, 80, 22, 5222, 8080]), rng.randint(30000, 60000), "ESTABLISHED", None)
+        for pid in rng.choices(list(pids), k=rows)
+    ]
+    return sockets, pids, domains
+
+
+def build_dicts(sockets, names, domains):
+    results = []
+    for c in sockets:
+        app_name = names[c.pid]
+        isBrowser = app_name.lower() in BROWSERS
+        domain = domains.get(c.ip) if isBrowser else None
+        entry = {
+            "id": (
+                f"{app_name}_{c.ip}_{c.port}"
+                if isBrowser
+                else f"{app_name}_{c.pid}_{c.ip}_{c.port}"
+            ),
+            "app": str(app_name),
+            "pid": int(c.pid),
+            "ip": str(c.ip) if c.ip else "0.0.0.0",
+            "port": int(c.port) if c.port else 0,
+            "type": "browser" if isBrowser else "process",
+            "domain": domain,
+            "is_threat": False,
+            "risk_weight": 0.5 if isBrowser else 1.0,
+            "threat_score": 0.0,
+        }
+        results.append(entry)
+    return results
+
+
+def build_records(sockets, names, domains):
+    records = []
+    for c in sockets:
+        app_name = names[c.pid]
+        isBrowser = app_name.lower() in BROWSERS
+        records.append(ConnRecord(
+            app_name, int(c.pid), pack_ip(c.ip), int(c.port) if c.port else 0, c.lport,
+            browser=isBrowser, domain=domains.get(c.ip) if isBrowser else None,
+        ))
+    return records
+
+
+def _best(fn, repeat=REPEAT):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def _allocations(fn):
+    """(retained bytes, peak bytes, live allocation blocks) of fn's result"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del result
+    return current, peak, blocks
+
+
+def run(rows=10000):
+    sockets, names, domains = synthetic_table(rows)
+    # Warm the address caches the way a long-running scan loop would
+    build_records(sockets, names, domains)
+
+    variants = {
+        "dict": (lambda: build_dicts(sockets, names, domains), lambda entries: entries),
+        "records": (lambda: build_records(sockets, names, domains), lambda records: [r.to_wire() for r in records]),
+    }
+    report = {"rows": rows}
+    for name, (build, wire) in variants.items():
+        retained, peak, blocks = _allocations(build)
+        built = build()
+        report[name] = {
+            "build_ms": round(_best(build), 2),
+            "retained_kb": round(retained / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "allocated_blocks": blocks,
+            "end_to_end_ms": round(_best(lambda: json.dumps({"connections": wire(build())})), 2),
+        }
+        assert len(wire(built)) == rows
+
+    same = build_dicts(sockets, names, domains) == [r.to_wire() for r in build_records(sockets, names, domains)]
+    report["wire_identical"] = same
+    return report
+
+
+if __name__ == "__main__":
+    report = run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,320 @@
+"""
+Reproducible benchmarks for the scan, inference and broadcast paths.
+
+  python benchmarks/bench_suite.py -o bench.json
+  python benchmarks/bench_suite.py --rows 100,1000 --churn 0.2 --compare bench.json
+
+Every case runs against benchmarks/synthetic.py instead of the live host, so two
+runs with the same options see the same tables:
+  scan/<rows>       SolarServersCore._scan_connections, model inference included
+                    when SolarServer_model.pkl is present; false_positive_share counts
+                    flagged rows whose host does not resolve to a flagged domain
+                    (--window-features scores with the traffic windows)
+  ai/...            AIEngine.predict_threat (verdict cache cold and warm) and
+                    check_url_threat, one call per op; the warm case cycles through
+                    at most VERDICT_CACHE_SIZE distinct keys and reports its hit_rate
+  broadcast/<rows>  Broadcaster.publish with the scan's events plus encoding and draining the frames of
+                    full/delta, json/binary subscribers
+
+Per case: ops/sec, p50/p99 latency per op (a tick for scan and broadcast) and the
+peak traced memory of one op. The JSON report goes to stdout or -o; --compare
+prints the change against an earlier report on stderr.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import FakeProcessIndex, FakeScanner, StubResolver, SyntheticHost  # noqa: E402
+
+ROWS = "100,1000,10000,100000"
+TICKS = 20
+WARMUP_TICKS = 2
+MEMORY_TICKS = 3
+AI_OPS = 20000
+WARMUP_OPS = 500
+SUBSCRIBERS = (("full", "json"), ("delta", "json"), ("delta", "binary"))
+
+
+def _quiet():
+    # Component status lines go to stderr so stdout stays valid JSON
+    return contextlib.redirect_stdout(sys.stderr)
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _summary(latencies, peak_bytes=None, **extra):
+    total = sum(latencies)
+    result = {
+        "ops": len(latencies),
+        "ops_per_sec": round(len(latencies) / total, 1) if total else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 4),
+    }
+    if peak_bytes is not None:
+        result["peak_kb"] = round(peak_bytes / 1024, 1)
+    result.update(extra)
+    return result
+
+
+def _peak(op, repeat=MEMORY_TICKS):
+    """Largest traced allocation peak of a single op, above what was live before it"""
+    tracemalloc.start()
+    worst = 0
+    try:
+        for _ in range(repeat):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            op()
+            worst = max(worst, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return worst
+
+
+def load_engine():
+    os.chdir(ROOT)  # model paths are relative to the repo root
+    try:
+        with _quiet():
+            from ai_engine import AIEngine
+            engine = AIEngine()
+    except ImportError as e:
+        print(f"AI unavailable: {e}", file=sys.stderr)
+        return None
+    return engine
+
+
+def _has_model(engine):
+    return engine is not None and engine.model is not None
+
+
+def make_core(host, engine, use_windows=False):
+    from SolarServers_core import SolarServersCore
+    with _quiet():
+        core = SolarServersCore(resolver=StubResolver(host), ai_load="off", use_windows=use_windows)
+    core.procs = FakeProcessIndex(host)
+    core.scanner = FakeScanner(host)
+    if _has_model(engine):
+        core.ai = engine
+        core.ai_state = "ready"
+    return core
+
+
+def bench_scan(rows, args, engine):
+    host = SyntheticHost(rows, args.churn, args.browser_share, args.threat_share, args.seed)
+    core = make_core(host, engine, args.window_features)
+    try:
+        for _ in range(WARMUP_TICKS):
+            core._scan_connections()
+        latencies = []
+        threats = false_positives = 0
+        for _ in range(args.ticks):
+            t = time.perf_counter()
+            core._scan_connections()
+            latencies.append(time.perf_counter() - t)
+            flagged = [r for r in core.records.values() if r.is_threat]
+            threats += len(flagged)
+            false_positives += sum(1 for r in flagged if not host.domains[r.ip_str].startswith("malware-"))
+        peak = _peak(core._scan_connections)
+        return _summary(
+            latencies, peak,
+            connections_per_sec=round(rows * len(latencies) / sum(latencies)),
+            threat_share_seen=round(threats / (rows * args.ticks), 4),
+            false_positive_share=round(false_positives / (rows * args.ticks), 4),
+            stage_ms=core.stage_timings,
+        )
+    finally:
+        core.shutdown()
+
+
+def bench_broadcast(rows, args, engine):
+    from SolarServers_stream import Broadcaster
+    host = SyntheticHost(rows, args.churn, args.browser_share, args.threat_share, args.seed)
+    core = make_core(host, engine)
+
+    async def run():
+        broadcaster = Broadcaster()
+        subs = [
+            broadcaster.subscribe(delta=mode == "delta", fmt=fmt)
+            for mode, fmt in SUBSCRIBERS for _ in range(args.subscribers)
+        ]
+
+        async def tick(packet, events):
+            broadcaster.publish(packet, events)
+            for sub in subs:
+                frame = await sub.next()
+                frame.encoded(sub.format)
+                broadcaster.sent(sub, frame)
+
+        for _ in range(WARMUP_TICKS):
+            await tick(*core.scan())
+        latencies = []
+        for _ in range(args.ticks):
+            packet, events = core.scan()  # the scan itself is not part of this case
+            t = time.perf_counter()
+            await tick(packet, events)
+            latencies.append(time.perf_counter() - t)
+
+        scans = [core.scan() for _ in range(MEMORY_TICKS)]
+        peak = 0
+        tracemalloc.start()
+        for packet, events in scans:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await tick(packet, events)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        return _summary(latencies, peak, subscribers=len(subs), protocol=broadcaster.stats.summary())
+
+    try:
+        return asyncio.run(run())
+    finally:
+        core.shutdown()
+
+
+def bench_ai(args, engine):
+    host = SyntheticHost(min(args.ai_ops, 10000), args.churn, args.browser_share, args.threat_share, args.seed)
+    rows = [(s.ip, s.port, "ESTABLISHED", host.domains[s.ip]) for s in host.sockets]
+    ops = [rows[i % len(rows)] for i in range(args.ai_ops)]
+    results = {}
+
+    def timed(fn, items):
+        latencies = []
+        for item in items:
+            t = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - t)
+        return latencies
+
+    if _has_model(engine):
+        def cold(row):
+            engine.cache.clear()
+            engine.predict_threat(*row)
+        timed(cold, ops[:WARMUP_OPS])
+        results["ai/predict_threat_cold"] = _summary(timed(cold, ops), _peak(lambda: cold(ops[0])))
+        # Distinct cache keys, no more than the cache holds, so every warm lookup is a hit
+        keyed = {(row[1], row[2], row[3]): row for row in rows}
+        warm_rows = list(keyed.values())[:engine.cache.maxsize]
+        engine.cache.clear()
+        engine.predict_threat_batch(warm_rows)  # fill the verdict cache
+        warm = lambda row: engine.predict_threat(*row)  # noqa: E731
+        hits, misses = engine.cache.hits, engine.cache.misses
+        latencies = timed(warm, [warm_rows[i % len(warm_rows)] for i in range(args.ai_ops)])
+        hits, misses = engine.cache.hits - hits, engine.cache.misses - misses
+        results["ai/predict_threat_warm"] = _summary(
+            latencies, _peak(lambda: warm(warm_rows[0])),
+            working_set=len(warm_rows), hit_rate=round(hits / max(1, hits + misses), 4),
+        )
+    else:
+        results["ai/predict_threat_cold"] = {"skipped": "no model (run train_brain.py)"}
+
+    if engine is None:
+        results["ai/check_url_threat"] = {"skipped": "ai_engine not importable"}
+        return results
+    # URL rules need no model files
+    domains = [row[3] for row in ops]
+    results["ai/check_url_threat"] = _summary(
+        timed(engine.check_url_threat, domains), _peak(lambda: engine.check_url_threat(domains[0])),
+        matched_share=round(sum(map(engine.check_url_threat, domains)) / len(domains), 4),
+    )
+    return results
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True, timeout=30)
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "") if out.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"{'case':32} {'ops/sec':>12} {'p50':>9} {'p99':>9} {'peak mem':>9}", file=sys.stderr)
+    for case, new in report["results"].items():
+        old = baseline.get(case)
+        if not old or "skipped" in old or "skipped" in new:
+            continue
+
+        def change(key):
+            if not old.get(key) or key not in new:
+                return "n/a"
+            return f"{new[key] / old[key] - 1:+.1%}"
+        print(f"{case:32} {change('ops_per_sec'):>12} {change('p50_ms'):>9} {change('p99_ms'):>9} {change('peak_kb'):>9}", file=sys.stderr)
+
+
+def run(args):
+    engine = None if args.no_ai else load_engine()
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "ai_backend": engine.backend_in_use if _has_model(engine) else None,
+        },
+        "config": {
+            "rows": args.rows, "ticks": args.ticks, "churn": args.churn, "browser_share": args.browser_share,
+            "threat_share": args.threat_share, "seed": args.seed, "subscribers": args.subscribers, "ai_ops": args.ai_ops,
+            "window_features": args.window_features,
+        },
+        "results": {},
+    }
+    results = report["results"]
+    if "ai" in args.cases:
+        results.update(bench_ai(args, engine))
+    for rows in args.rows:
+        if "scan" in args.cases:
+            results[f"scan/{rows}"] = bench_scan(rows, args, engine)
+            print(f"scan/{rows}: {results[f'scan/{rows}']['p50_ms']} ms p50", file=sys.stderr)
+        if "broadcast" in args.cases:
+            results[f"broadcast/{rows}"] = bench_broadcast(rows, args, engine)
+            print(f"broadcast/{rows}: {results[f'broadcast/{rows}']['p50_ms']} ms p50", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic-host benchmarks for scan, inference and broadcast")
+    parser.add_argument("--rows", default=ROWS, type=lambda s: [int(x) for x in s.split(",")], help=f"table sizes (default {ROWS})")
+    parser.add_argument("--ticks", type=int, default=TICKS)
+    parser.add_argument("--churn", type=float, default=0.05, help="share of sockets replaced per tick")
+    parser.add_argument("--browser-share", type=float, default=0.4)
+    parser.add_argument("--threat-share", type=float, default=0.02, help="share of hosts resolving to a flagged domain")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--subscribers", type=int, default=2, help="subscribers per (mode, format) in broadcast cases")
+    parser.add_argument("--ai-ops", type=int, default=AI_OPS)
+    parser.add_argument("--cases", default="scan,ai,broadcast", type=lambda s: set(s.split(",")))
+    parser.add_argument("--no-ai", action="store_true", help="scan without the model")
+    parser.add_argument("--window-features", action="store_true", help="score scan rows with their traffic windows (SOLAR_WINDOW_FEATURES)")
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
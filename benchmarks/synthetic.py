@@ -0,0 +1,134 @@
+"""
+Deterministic stand-ins for the host: socket table, process index and DNS.
+
+SyntheticHost generates a table of `rows` ESTABLISHED sockets from a seed and
+replaces a `churn` share of them every tick, so a scan sees the same sequence
+of tables on every run and every machine. `browser_share` of the sockets belong
+to browser processes; `threat_share` of the destination hosts reverse-resolve to
+a name on the built-in URL rules (visible as threats on browser connections).
+One of the apps is on IGNORE_APPS, so the ignore filter does real work.
+"""
+
+import os
+import random
+import string
+import sys
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SolarServers_core import BROWSERS  # noqa: E402
+from SolarServers_scanner import Socket  # noqa: E402
+
+APPS = ["python.exe", "code.exe", "slack.exe", "spotify.exe", "discord.exe", "node.exe", "svchost.exe"]
+PORTS = [443, 443, 443, 80, 22, 5222, 8080, 3478]
+# Destination hosts per socket; connections share hosts like real traffic does
+HOSTS_PER_ROW = 0.25
+PROCESSES = 200
+
+
+def _name(i: int) -> str:
+    # Letters only: runs of digits would trip the \d{4,} URL rule
+    letters = string.ascii_lowercase
+    out = ""
+    while True:
+        i, r = divmod(i, 26)
+        out += letters[r]
+        if not i:
+            return out
+
+
+class SyntheticHost:
+    def __init__(self, rows: int, churn: float = 0.05, browser_share: float = 0.4, threat_share: float = 0.02, seed: int = 1):
+        self.rows = rows
+        self.churn = churn
+        self.rng = random.Random(seed)
+        rng = self.rng
+
+        browsers = max(1, int(PROCESSES * browser_share)) if browser_share else 0
+        self.names: Dict[int, str] = {}
+        for i in range(PROCESSES):
+            self.names[1000 + i] = BROWSERS[i % len(BROWSERS)] if i < browsers else APPS[i % len(APPS)]
+        self.browser_pids = [p for p, n in self.names.items() if n in BROWSERS]
+        self.other_pids = [p for p, n in self.names.items() if n not in BROWSERS]
+        self.browser_share = browser_share
+
+        n_hosts = max(1, int(rows * HOSTS_PER_ROW))
+        self.hosts = [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(1, n_hosts + 1)]
+        self.domains: Dict[str, str] = {}
+        for i, ip in enumerate(self.hosts):
+            if rng.random() < threat_share:
+                self.domains[ip] = f"malware-{_name(i)}.xyz"
+            else:
+                self.domains[ip] = f"cdn-{_name(i)}.example.com"
+
+        self.next_lport = 10000
+        self.sockets: List[Socket] = [self._socket() for _ in range(rows)]
+        self.tick = 0
+
+    def _socket(self) -> Socket:
+        rng = self.rng
+        browser = self.browser_pids and (not self.other_pids or rng.random() < self.browser_share)
+        pid = rng.choice(self.browser_pids if browser else self.other_pids)
+        self.next_lport += 1
+        return Socket(pid, rng.choice(self.hosts), rng.choice(PORTS), self.next_lport, "ESTABLISHED", None)
+
+    def advance(self):
+        """Close `churn` of the sockets and open as many new ones"""
+        self.tick += 1
+        n = int(self.rows * self.churn)
+        for i in self.rng.sample(range(self.rows), n):
+            self.sockets[i] = self._socket()
+
+
+class FakeScanner:
+    """Scanner interface over a SyntheticHost; each scan() is one tick"""
+
+    name = "synthetic"
+
+    def __init__(self, host: SyntheticHost):
+        self.host = host
+        self.started = False
+
+    def scan(self, exclude_pid: int = 0) -> List[Socket]:
+        if self.started:
+            self.host.advance()
+        self.started = True
+        return list(self.host.sockets)
+
+
+class FakeProcessIndex:
+    """ProcessIndex interface backed by the synthetic pid table"""
+
+    def __init__(self, host: SyntheticHost):
+        self.host = host
+
+    def refresh(self, mapper=map):
+        pass
+
+    def name(self, pid: int) -> str:
+        return self.host.names.get(pid, "System/Hidden")
+
+    def metrics(self) -> Dict:
+        return {"processes": len(self.host.names)}
+
+
+class StubResolver:
+    """DomainResolver interface answering from the synthetic DNS table, every lookup a hit"""
+
+    def __init__(self, host: SyntheticHost):
+        self.host = host
+        self.stats = {"hits": 0, "misses": 0, "lookups": 0}
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def get(self, ip: str) -> Optional[str]:
+        self.stats["hits"] += 1
+        return self.host.domains.get(ip)
+
+    def metrics(self) -> Dict:
+        return dict(self.stats)
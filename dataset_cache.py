@@ -0,0 +1,86 @@
+"""
+On-disk cache of the preprocessed NSL-KDD training matrix.
+
+An entry is keyed by a hash of the source files and the preprocessing parameters and
+holds the encoded, scaled and selected features as a float32 .npy (opened memory
+mapped), int8 labels, the fitted encoders/scaler/selector and a small JSON manifest.
+A repeat training run loads it in milliseconds instead of re-parsing the CSVs.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+
+CACHE_DIR = os.environ.get("SOLAR_DATA_CACHE", ".solar_cache")
+# Bump when the layout or the preprocessing code changes
+CACHE_VERSION = 1
+
+
+def _file_digest(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(sources, params):
+    """Hash of the source file contents plus the preprocessing parameters"""
+    h = hashlib.sha1()
+    h.update(json.dumps({"version": CACHE_VERSION, "params": params}, sort_keys=True).encode())
+    for path in sources:
+        h.update(os.path.basename(path).encode())
+        h.update(_file_digest(path).encode())
+    return h.hexdigest()[:16]
+
+
+def _entry(key, root=None):
+    return os.path.join(root or CACHE_DIR, key)
+
+
+def load(key, root=None):
+    """Returns (X memmap, y, transformers dict, meta dict), or None on a miss"""
+    path = _entry(key, root)
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(path, "y.npy")).astype(np.int64)
+        transformers = joblib.load(os.path.join(path, "transformers.pkl"))
+    except (OSError, ValueError, EOFError):
+        return None
+    if X.shape[0] != meta.get("rows") or len(y) != X.shape[0]:
+        return None
+    return X, y, transformers, meta
+
+
+def store(key, X, y, transformers, meta, root=None):
+    """Write an entry atomically; returns X re-opened as a read-only memmap"""
+    path = _entry(key, root)
+    tmp = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "X.npy"), np.ascontiguousarray(X, dtype=np.float32))
+    np.save(os.path.join(tmp, "y.npy"), np.asarray(y, dtype=np.int8))
+    joblib.dump(transformers, os.path.join(tmp, "transformers.pkl"))
+    meta = {**meta, "rows": int(X.shape[0]), "columns": int(X.shape[1]), "created": time.time()}
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+
+
+def prune(keep, root=None):
+    """Drop every entry except `keep`"""
+    root = root or CACHE_DIR
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        if name != keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -0,0 +1,174 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Regex metacharacters that make a pattern more than a plain substring
+_META = set('.^$*+?{}[]|()\\')
+
+# Names on the standard header lines of hosts-format blocklists, never blocked
+HOSTS_RESERVED = {
+    'localhost', 'localhost.localdomain', 'local', 'broadcasthost',
+    'ip6-localhost', 'ip6-loopback', '0.0.0.0',
+}
+
+
+def _literal(pattern: str) -> Optional[str]:
+    """Unescape a pattern if it is a plain literal, otherwise None"""
+    text = re.sub(r'\\([.\-/])', r'\1', pattern)
+    if any(ch in _META for ch in text.replace('.', '')):
+        return None
+    if re.search(r'(?<!\\)\.', pattern):  # bare '.' is a wildcard
+        return None
+    return text
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: finds any of many keywords in one pass over the text"""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Optional[str]] = [None]
+        self.built = True
+
+    def __len__(self):
+        return sum(1 for o in self.out if o is not None)
+
+    def add(self, keyword: str, rule: str):
+        state = 0
+        for ch in keyword:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(None)
+            state = nxt
+        if self.out[state] is None:
+            self.out[state] = rule
+        self.built = False
+
+    def build(self):
+        # Breadth-first fail links; outputs are inherited so a match is seen at its end state
+        queue = []
+        for nxt in self.goto[0].values():
+            self.fail[nxt] = 0
+            queue.append(nxt)
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                if self.out[nxt] is None:
+                    self.out[nxt] = self.out[self.fail[nxt]]
+        self.built = True
+
+    def search(self, text: str) -> Optional[str]:
+        if not self.built:
+            self.build()
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] is not None:
+                return out[state]
+        return None
+
+
+class DomainMatcher:
+    """Single-pass matcher for the malicious domain rules.
+
+    Rules are split by shape when added:
+      - anchored suffixes like r'\\.ru$' go into a suffix dict, checked label by label
+      - plain keywords go into one Aho-Corasick automaton
+      - anything else is joined into one alternation regex
+    Blocklist domains match themselves and any subdomain. Lookup cost depends on the
+    length of the domain, not on the number of rules.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.suffixes: Dict[str, str] = {}
+        self.blocked: Dict[str, str] = {}
+        self.keywords = KeywordAutomaton()
+        self.regex_rules: List[str] = []
+        self.regex = None
+        for pattern in patterns:
+            self.add_pattern(pattern)
+        self.build()
+
+    def add_pattern(self, pattern: str):
+        if pattern.startswith(r'\.') and pattern.endswith('$'):
+            suffix = _literal(pattern[2:-1])
+            if suffix:
+                self.suffixes[suffix.lower()] = pattern
+                return
+        keyword = _literal(pattern)
+        if keyword:
+            self.keywords.add(keyword.lower(), pattern)
+        else:
+            self.regex_rules.append(pattern)
+            self.regex = None
+
+    def add_blocklist(self, domains: Iterable[str], label: str = "blocklist") -> int:
+        """Add blocked domains; accepts plain, '*.'-prefixed or hosts-file style lines"""
+        added = 0
+        for line in domains:
+            fields = line.split('#', 1)[0].lower().split()
+            # hosts format: an address followed by one or more names
+            for name in fields[1:] if len(fields) > 1 else fields:
+                domain = name.lstrip('*').lstrip('.')
+                if domain and domain not in HOSTS_RESERVED:
+                    self.blocked[domain] = f"{label}:{domain}"
+                    added += 1
+        return added
+
+    def load_blocklist(self, path: str) -> int:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return self.add_blocklist(f, label=path)
+
+    def build(self):
+        self.keywords.build()
+        if self.regex_rules:
+            self.regex = re.compile('|'.join(f'(?P<r{i}>{p})' for i, p in enumerate(self.regex_rules)))
+        else:
+            self.regex = None
+
+    def match(self, url: str) -> Optional[str]:
+        """Return the rule that matched, or None"""
+        if not url:
+            return None
+        text = url.lower()
+
+        labels = text.split('.')
+        if self.suffixes:
+            for i in range(1, len(labels)):
+                rule = self.suffixes.get('.'.join(labels[i:]))
+                if rule:
+                    return rule
+
+        if self.blocked:
+            host = text.split('//', 1)[-1].split('/', 1)[0].split(':', 1)[0]
+            parts = host.split('.')
+            for i in range(len(parts)):
+                rule = self.blocked.get('.'.join(parts[i:]))
+                if rule:
+                    return rule
+
+        rule = self.keywords.search(text)
+        if rule:
+            return rule
+
+        if self.regex_rules and self.regex is None:
+            self.build()
+        if self.regex:
+            m = self.regex.search(text)
+            if m:
+                return self.regex_rules[int(m.lastgroup[1:])]
+        return None
@@ -0,0 +1,250 @@
+"""
+Flattens the trained RandomForest, scaler, SelectKBest and label encoders into one
+array-backed artifact, and runs it with a vectorized NumPy traversal.
+
+  python forest_compiler.py export            # SolarServer_*.pkl -> SolarServer_model_compiled.npz
+  python forest_compiler.py verify [file]     # compare against sklearn on KDDTest+.txt
+  python forest_compiler.py bench [file]      # latency of both paths
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+
+COMPILED_PATH = "SolarServer_model_compiled.npz"
+MODEL_PATH = "SolarServer_model.pkl"
+# Rows per traversal pass; bounds the (rows x trees) working set
+CHUNK_ROWS = 4096
+
+
+class CompiledEncoder:
+    """LabelEncoder.transform without sklearn"""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+        self.index = {c: i for i, c in enumerate(self.classes_.tolist())}
+
+    def transform(self, values):
+        try:
+            return np.array([self.index[v] for v in values], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: {e}")
+
+
+class CompiledPreprocessor:
+    """StandardScaler followed by SelectKBest, folded into one column pick and affine map"""
+
+    def __init__(self, columns, mean, scale):
+        self.columns = np.asarray(columns, dtype=np.int64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return (X[:, self.columns] - self.mean) / self.scale
+
+
+class CompiledForest:
+    """RandomForestClassifier as flat node arrays.
+
+    All trees live in one set of arrays; leaves point at themselves with an infinite
+    threshold. Traversal advances every unfinished (sample, tree) pair one level per
+    step and drops the pairs that reached a leaf.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.is_leaf = left == np.arange(len(left))
+
+    @classmethod
+    def from_sklearn(cls, model):
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            ids = np.arange(n, dtype=np.int64)
+            leaf = tree.children_left == -1
+            feature.append(np.where(leaf, 0, tree.feature).astype(np.int64))
+            threshold.append(np.where(leaf, np.inf, tree.threshold).astype(np.float64))
+            left.append(np.where(leaf, ids, tree.children_left) + offset)
+            right.append(np.where(leaf, ids, tree.children_right) + offset)
+            # Same normalisation DecisionTreeClassifier.predict_proba applies
+            v = tree.value[:, 0, :].astype(np.float64)
+            normalizer = v.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(v / normalizer)
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+        return cls(
+            np.concatenate(feature), np.concatenate(threshold),
+            np.concatenate(left), np.concatenate(right),
+            np.concatenate(value), np.array(roots, dtype=np.int64),
+            max_depth, np.asarray(model.classes_),
+        )
+
+    def apply(self, X):
+        """Leaf index for every (sample, tree)"""
+        # Trees compare float32 features against float64 thresholds, as sklearn does
+        X = np.asarray(X, dtype=np.float32)
+        n, n_trees = X.shape[0], len(self.roots)
+        node = np.tile(self.roots, n)
+        sample = np.repeat(np.arange(n), n_trees)
+        active = np.flatnonzero(~self.is_leaf[node])
+        for _ in range(self.max_depth):
+            if not len(active):
+                break
+            current = node[active]
+            go_left = X[sample[active], self.feature[current]] <= self.threshold[current]
+            nxt = np.where(go_left, self.left[current], self.right[current])
+            node[active] = nxt
+            active = active[~self.is_leaf[nxt]]
+        return node.reshape(n, n_trees)
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        proba = np.zeros((X.shape[0], self.value.shape[1]))
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            leaves = self.apply(X[start:start + CHUNK_ROWS])
+            # Accumulate tree by tree, in the same order as sklearn
+            for t in range(leaves.shape[1]):
+                proba[start:start + CHUNK_ROWS] += self.value[leaves[:, t]]
+        return proba / len(self.roots)
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def file_digest(path):
+    """SHA-256 of a file, hex"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_digest(path=COMPILED_PATH):
+    """Digest of the pickle an artifact was exported from, "" when it was not recorded"""
+    with np.load(path, allow_pickle=False) as data:
+        return str(data["source_sha256"]) if "source_sha256" in data.files else ""
+
+
+def export(model, scaler, selector, encoders, path=COMPILED_PATH, source=MODEL_PATH):
+    forest = CompiledForest.from_sklearn(model)
+    n_features = scaler.n_features_in_ if scaler is not None else model.n_features_in_
+    columns = selector.get_support(indices=True) if selector is not None else np.arange(n_features)
+    mean = scaler.mean_[columns] if scaler is not None else np.zeros(len(columns))
+    scale = scaler.scale_[columns] if scaler is not None else np.ones(len(columns))
+    arrays = {
+        "feature": forest.feature, "threshold": forest.threshold,
+        "left": forest.left, "right": forest.right, "value": forest.value,
+        "roots": forest.roots, "max_depth": np.array(forest.max_depth),
+        "classes": forest.classes_,
+        "columns": columns, "mean": mean, "scale": scale,
+        "encoder_names": np.array(list(encoders), dtype=str),
+        # Lets the engine tell whether the pickle was retrained since; mtimes do not survive a checkout
+        "source_sha256": np.array(file_digest(source) if os.path.exists(source) else ""),
+    }
+    for name, enc in encoders.items():
+        arrays[f"encoder_{name}"] = np.asarray(enc.classes_, dtype=str)
+    np.savez_compressed(path, **arrays)
+    print(f"Compiled forest: {len(forest.roots)} trees, {len(forest.feature)} nodes, depth {forest.max_depth} -> {path}")
+    return path
+
+
+def load(path=COMPILED_PATH):
+    """Returns (forest, preprocessor, encoders)"""
+    with np.load(path, allow_pickle=False) as data:
+        forest = CompiledForest(
+            data["feature"], data["threshold"], data["left"], data["right"],
+            data["value"], data["roots"], data["max_depth"], data["classes"],
+        )
+        preprocessor = CompiledPreprocessor(data["columns"], data["mean"], data["scale"])
+        encoders = {str(name): CompiledEncoder(data[f"encoder_{name}"]) for name in data["encoder_names"]}
+    return forest, preprocessor, encoders
+
+
+def _load_sklearn():
+    import joblib
+    return (
+        joblib.load(MODEL_PATH),
+        joblib.load("SolarServer_scaler.pkl"),
+        joblib.load("SolarServer_selector.pkl"),
+        joblib.load("SolarServer_encoders.pkl"),
+    )
+
+
+def _raw_matrix(path, encoders):
+    """NSL-KDD rows -> (encoded 41-column matrix, labels) with the given encoders"""
+    import pandas as pd
+    from ai_engine import FEATURE_COLUMNS
+    df = pd.read_csv(path, names=FEATURE_COLUMNS + ["label", "difficulty"], header=None)
+    for col, enc in encoders.items():
+        df[col] = enc.transform(df[col])
+    return df[FEATURE_COLUMNS].values.astype(np.float64), (df["label"] != "normal").values
+
+
+def verify(path="KDDTest+.txt"):
+    model, scaler, selector, encoders = _load_sklearn()
+    forest, preprocessor, _ = load()
+    X, _ = _raw_matrix(path, encoders)
+
+    expected = model.predict_proba(selector.transform(scaler.transform(X)))
+    got = forest.predict_proba(preprocessor.transform(X))
+    same = np.array_equal(model.classes_.take(expected.argmax(axis=1)), forest.predict(preprocessor.transform(X)))
+    print(f"{len(X)} rows | predictions identical: {same} | max |proba diff|: {np.abs(expected - got).max():.3g}")
+    return same
+
+
+def _timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    times = np.array(times) * 1000
+    return np.percentile(times, 50), np.percentile(times, 99)
+
+
+def bench(path="KDDTest+.txt", repeat=200):
+    model, scaler, selector, encoders = _load_sklearn()
+    forest, preprocessor, _ = load()
+    X, _ = _raw_matrix(path, encoders)
+    one = X[:1]
+    batch = X[:256]
+
+    paths = {
+        "sklearn": lambda rows: model.predict_proba(selector.transform(scaler.transform(rows))),
+        "compiled": lambda rows: forest.predict_proba(preprocessor.transform(rows)),
+    }
+    for name, fn in paths.items():
+        p50, p99 = _timeit(lambda: fn(one), repeat)
+        b50, b99 = _timeit(lambda: fn(batch), max(10, repeat // 10))
+        f50, _ = _timeit(lambda: fn(X), 3)
+        print(f"{name:9s} | 1 row p50 {p50:.3f}ms p99 {p99:.3f}ms | 256 rows p50 {b50:.3f}ms p99 {b99:.3f}ms | {len(X)} rows {f50:.1f}ms")
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if cmd == "export":
+        export(*_load_sklearn())
+    elif cmd == "verify":
+        sys.exit(0 if verify(*sys.argv[2:3]) else 1)
+    elif cmd == "bench":
+        bench(*sys.argv[2:3])
+    else:
+        print(__doc__)
+        sys.exit(2)
@@ -7,6 +7,13 @@ const beams = {};
 let tier = "LOW_END"
 let maxPlanets = 100;
 
+// Delta protocol state: last applied seq and the current connection set by id
+const stream = { seq: null, conns: new Map(), awaitingSnapshot: true };
+// "binary" (columnar typed arrays, see SolarServers_wire.py) or "json"
+const WIRE_FORMAT = "binary";
+// Binary frames are decoded in arrival order even when some need async inflating
+let decoding = Promise.resolve();
+
 function setTier(newTier) {
     tier = newTier;
     if (tier === "HIGH_END") {
@@ -14,6 +21,7 @@ function setTier(newTier) {
     } else {
         maxPlanets = 100;
     }
+    subscribe();
     const ids = Object.keys(planets);
     if (ids.length <= maxPlanets) return;
     for (let i = 0; i < (ids.length - maxPlanets); i++) {
@@ -203,6 +211,7 @@ function updateFromPacket(packet) {
                 "pid": conn.pid,
                 "type": conn.type,
                 "domain": conn.domain,
+                "host": conn.host,
                 "is_threat": conn.is_threat
             };
 
@@ -227,6 +236,116 @@ function updateFromPacket(packet) {
     });
 }
 
+// Server-side filters, e.g. { type: "browser", threats_only: true, ports: [443, [8000, 8100]], domain: "*.github.com" }
+const FILTER = {};
+
+function subscribe() {
+    // The server keeps only the maxPlanets highest-risk connections, so nothing is sent just to be dropped here
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: "subscribe", filter: FILTER, limit: maxPlanets }));
+    }
+}
+
+function requestResync() {
+    if (stream.awaitingSnapshot) return;
+    stream.awaitingSnapshot = true;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: "resync" }));
+    }
+}
+
+const FLAG_DEFLATE = 1, BROWSER = 1, THREAT = 2, PENDING = 4;
+const textDecoder = new TextDecoder();
+
+async function inflate(bytes) {
+    const body = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+    return new Response(body).arrayBuffer();
+}
+
+// Columnar binary frame -> the same object shape as a JSON frame
+async function decodeBinaryFrame(buffer) {
+    const head = new Uint8Array(buffer, 0, 4);
+    if (head[0] !== 0x53 || head[1] !== 0x42) throw new Error("not a binary frame");
+    let body = buffer, offset = 4;
+    if (head[3] & FLAG_DEFLATE) {
+        body = await inflate(new Uint8Array(buffer, 4));
+        offset = 0;
+    }
+    const view = new DataView(body);
+    const headLen = view.getUint32(offset, true);
+    const frame = JSON.parse(textDecoder.decode(new Uint8Array(body, offset + 4, headLen)));
+    offset += 4 + headLen;
+    const strings = frame.strings;
+
+    // Zero-copy views over the 4-byte aligned columns
+    const column = (Type, n) => {
+        const col = new Type(body, offset, n);
+        offset += n * Type.BYTES_PER_ELEMENT;
+        return col;
+    };
+    for (const [name, n] of frame.sections) {
+        const pid = column(Uint32Array, n), port = column(Uint32Array, n);
+        const app = column(Uint32Array, n), ip = column(Uint32Array, n);
+        const domain = column(Int32Array, n), risk = column(Float32Array, n);
+        const score = column(Float32Array, n);
+        const flags = column(Uint8Array, n);
+        offset += (4 - (n % 4)) % 4;
+        // Aggregator frames: the agent host of every connection
+        const host = frame.hosts ? column(Uint32Array, n) : null;
+
+        const conns = new Array(n);
+        for (let i = 0; i < n; i++) {
+            const browser = (flags[i] & BROWSER) !== 0;
+            const d = domain[i] >= 0 ? strings[domain[i]] : null;
+            const a = strings[app[i]], addr = strings[ip[i]];
+            // Same rule as ConnRecord.id on the server
+            const id = browser ? `${a}_${addr}_${port[i]}` : `${a}_${pid[i]}_${addr}_${port[i]}`;
+            conns[i] = {
+                id: host ? `${strings[host[i]]}/${id}` : id,
+                app: a,
+                pid: pid[i],
+                ip: addr,
+                port: port[i],
+                type: browser ? "browser" : "process",
+                domain: d,
+                is_threat: flags[i] & PENDING ? null : (flags[i] & THREAT) !== 0,
+                risk_weight: risk[i],
+                threat_score: Math.round(score[i] * 1000) / 1000,
+            };
+            if (host) conns[i].host = strings[host[i]];
+        }
+        frame[name] = conns;
+    }
+    delete frame.sections;
+    delete frame.strings;
+    delete frame.hosts;
+    return frame;
+}
+
+function applyFrame(frame) {
+    if (frame.type === "snapshot") {
+        stream.conns = new Map(frame.connections.map(c => [c.id, c]));
+        stream.awaitingSnapshot = false;
+    } else if (frame.type === "delta") {
+        if (stream.awaitingSnapshot) return null;
+        // Coalesced deltas span several ticks and name the seq they apply on top of
+        const base = frame.base ?? frame.seq - 1;
+        if (base !== stream.seq) {
+            console.warn(`Delta gap ${stream.seq} -> ${frame.seq}, resyncing`);
+            requestResync();
+            return null;
+        }
+        frame.removed.forEach(id => stream.conns.delete(id));
+        frame.added.forEach(c => stream.conns.set(c.id, c));
+        frame.updated.forEach(c => stream.conns.set(c.id, c));
+    } else {
+        // Full packet from a server without delta support
+        return frame;
+    }
+    stream.seq = frame.seq;
+    return { meta: frame.meta, connections: Array.from(stream.conns.values()) };
+}
+
 function animate() {
     requestAnimationFrame(animate);
 
@@ -245,6 +364,7 @@ function animate() {
 
         tooltip.innerHTML = `
             <strong>${d.type === "browser" ? "Browser" : "Process"}</strong><br>
+            ${d.host ? `Host: ${d.host}<br>` : ""}
             ${
                 d.type === "browser"
                 ? `
@@ -325,20 +445,27 @@ function animate() {
 }
 
 function initWebSocket() {
-    ws = new WebSocket("ws://127.0.0.1:8000/ws");
+    ws = new WebSocket(`ws://127.0.0.1:8000/ws?delta=true&format=${WIRE_FORMAT}`);
+    ws.binaryType = "arraybuffer";
 
     ws.onopen = () => {
         console.log("WebSocket connected");
+        stream.seq = null;
+        stream.awaitingSnapshot = true;
+        subscribe();
     };
 
     ws.onmessage = (event) => {
-        console.log("Packet received");
-        try {
-            const packet = JSON.parse(event.data);
-            updateFromPacket(packet);
-        } catch (e) {
-            console.error("Invalid packet", e);
-        }
+        const decoded = typeof event.data === "string"
+            ? Promise.resolve().then(() => JSON.parse(event.data))
+            : decodeBinaryFrame(event.data);
+        decoding = decoding
+            .then(() => decoded)
+            .then(frame => {
+                const packet = applyFrame(frame);
+                if (packet) updateFromPacket(packet);
+            })
+            .catch(e => console.error("Invalid packet", e));
     };
 
     ws.onclose = () => {
@@ -0,0 +1,212 @@
+"""
+Smaller threat-model variants for hosts that cannot afford the full forest.
+
+Run through `python train_brain.py --variants`. Every variant is trained on the same
+preprocessed NSL-KDD train split and measured on KDDTest+.txt for accuracy,
+single-row and batch latency (p50/p99), artifact size and load time, so one can be
+picked for LOW_END hosts. The distilled variants learn the baseline forest's
+class probabilities rather than the raw labels.
+
+The deployed reference was trained on train+test combined, so its test accuracy is
+leaked. A "baseline" forest with the same parameters is trained on the train split
+only, and the recommendation is measured against that one.
+"""
+
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeClassifier
+
+import forest_compiler
+from train_brain import feature_cols, fit_encoders, fit_preprocessing
+
+VARIANTS_DIR = "variants"
+SINGLE_ROW_REPEAT = 300
+BATCH_ROWS = 256
+BATCH_REPEAT = 50
+# A variant is recommended for LOW_END if it loses at most this much accuracy
+MAX_ACCURACY_LOSS = 0.01
+
+
+def _split(dfs):
+    if "train" in dfs and "test" in dfs:
+        print("Variants: training on KDDTrain+, measuring on KDDTest+")
+        train, test = dfs["train"].copy(), dfs["test"].copy()
+    elif dfs:
+        df = next(iter(dfs.values())).copy()
+        print(f"Variants: only one dataset available, using a 70/30 split of {len(df)} rows")
+        train, test = train_test_split(df, test_size=0.3, random_state=42, stratify=df["label"] == "normal")
+    else:
+        raise SystemExit("Variants need the NSL-KDD files; synthetic data is not meaningful here")
+    return train, test
+
+
+def _preprocess(train, test):
+    """Use the deployed encoders/scaler/selector when present so variants are drop-in replacements"""
+    deployed = all(os.path.exists(p) for p in ("SolarServer_encoders.pkl", "SolarServer_scaler.pkl", "SolarServer_selector.pkl"))
+    if deployed:
+        encoders = joblib.load("SolarServer_encoders.pkl")
+        sc = joblib.load("SolarServer_scaler.pkl")
+        selector = joblib.load("SolarServer_selector.pkl")
+        for df in (train, test):
+            df["label"] = (df["label"] == "normal").astype(int)
+            for col, enc in encoders.items():
+                df[col] = enc.transform(df[col])
+        X_train = selector.transform(sc.transform(train[feature_cols].values))
+    else:
+        both = pd.concat([train, test], keys=["train", "test"])
+        fit_encoders(both)
+        train, test = both.loc["train"], both.loc["test"]
+        sc, selector, X_train = fit_preprocessing(train[feature_cols].values, train["label"].values)
+    X_test = selector.transform(sc.transform(test[feature_cols].values))
+    return X_train, train["label"].values, X_test, test["label"].values
+
+
+def _percentiles(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    times = np.array(times) * 1000
+    return round(float(np.percentile(times, 50)), 4), round(float(np.percentile(times, 99)), 4)
+
+
+def _latency(predict_proba, X):
+    rows = iter([X[i:i + 1] for i in range(min(len(X), SINGLE_ROW_REPEAT))])
+    p50, p99 = _percentiles(lambda: predict_proba(next(rows)), min(len(X), SINGLE_ROW_REPEAT))
+    batch = X[:BATCH_ROWS]
+    b50, b99 = _percentiles(lambda: predict_proba(batch), BATCH_REPEAT)
+    return {"single_p50_ms": p50, "single_p99_ms": p99, "batch_p50_ms": b50, "batch_p99_ms": b99}
+
+
+def measure(name, model, X_test, y_test):
+    path = os.path.join(VARIANTS_DIR, f"{name}.pkl")
+    joblib.dump(model, path)
+    t = time.perf_counter()
+    model = joblib.load(path)
+    load_ms = (time.perf_counter() - t) * 1000
+
+    row = {
+        "variant": name,
+        "accuracy": round(float((model.predict(X_test) == y_test).mean()), 4),
+        "size_kb": round(os.path.getsize(path) / 1024, 1),
+        "load_ms": round(load_ms, 1),
+        **_latency(model.predict_proba, X_test),
+    }
+
+    if hasattr(model, "estimators_"):
+        npz = os.path.join(VARIANTS_DIR, f"{name}_compiled.npz")
+        forest_compiler.export(model, None, None, {}, path=npz)
+        t = time.perf_counter()
+        forest, _, _ = forest_compiler.load(npz)
+        row["compiled"] = {
+            "size_kb": round(os.path.getsize(npz) / 1024, 1),
+            "load_ms": round((time.perf_counter() - t) * 1000, 1),
+            **_latency(forest.predict_proba, X_test),
+        }
+    return row
+
+
+def _fit_soft(model, X, proba, classes):
+    """Fit a classifier to class probabilities: each row once per class, weighted by its probability"""
+    X_soft = np.vstack([X] * len(classes))
+    y_soft = np.repeat(classes, len(X))
+    weights = proba.T.reshape(-1)
+    keep = weights > 0
+    return model.fit(X_soft[keep], y_soft[keep], sample_weight=weights[keep])
+
+
+def build_variants(X_train, y_train):
+    variants = {}
+    if os.path.exists("SolarServer_model.pkl"):
+        print("Reference: deployed SolarServer_model.pkl")
+        reference = variants["reference"] = joblib.load("SolarServer_model.pkl")
+        # Same parameters, train split only: the reference has seen the test rows
+        print("Training baseline...")
+        variants["baseline"] = clone(reference).fit(X_train, y_train)
+    else:
+        print("Reference: training a 100-tree forest")
+        reference = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1).fit(X_train, y_train)
+        variants["baseline"] = reference
+    n_trees = getattr(reference, "n_estimators", 100)
+
+    # Distilled models learn the baseline's attack probabilities; the reference has seen the test rows
+    teacher = variants["baseline"]
+    soft_proba = teacher.predict_proba(X_train)
+
+    candidates = {
+        "rf_depth12": RandomForestClassifier(n_estimators=n_trees, max_depth=12, random_state=42, n_jobs=-1),
+        "rf_25trees": RandomForestClassifier(n_estimators=25, random_state=42, n_jobs=-1),
+        "rf_25trees_depth12": RandomForestClassifier(n_estimators=25, max_depth=12, random_state=42, n_jobs=-1),
+        "rf_10trees_depth8": RandomForestClassifier(n_estimators=10, max_depth=8, random_state=42, n_jobs=-1),
+    }
+    for name, model in candidates.items():
+        print(f"Training {name}...")
+        variants[name] = model.fit(X_train, y_train)
+    print("Training distilled_tree...")
+    variants["distilled_tree"] = _fit_soft(DecisionTreeClassifier(max_depth=15, random_state=42), X_train, soft_proba, teacher.classes_)
+    print("Training distilled_logreg...")
+    variants["distilled_logreg"] = _fit_soft(LogisticRegression(max_iter=2000), X_train, soft_proba, teacher.classes_)
+    return variants
+
+
+def _table(rows):
+    lines = [
+        "| variant | accuracy | size KB | load ms | 1-row p50/p99 ms | 256-row p50/p99 ms | compiled 1-row p50/p99 ms | compiled size KB |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for r in rows:
+        c = r.get("compiled")
+        compiled_latency = f"{c['single_p50_ms']}/{c['single_p99_ms']}" if c else "-"
+        compiled_size = c["size_kb"] if c else "-"
+        lines.append(
+            f"| {r['variant']} | {r['accuracy']:.4f} | {r['size_kb']} | {r['load_ms']} "
+            f"| {r['single_p50_ms']}/{r['single_p99_ms']} | {r['batch_p50_ms']}/{r['batch_p99_ms']} "
+            f"| {compiled_latency} | {compiled_size} |"
+        )
+    return "\n".join(lines)
+
+
+def recommend(rows):
+    """Fastest single-row variant within MAX_ACCURACY_LOSS of the train-only baseline"""
+    baseline = next(r for r in rows if r["variant"] == "baseline")
+
+    def p99(r):
+        return min(r["single_p99_ms"], r["compiled"]["single_p99_ms"]) if r.get("compiled") else r["single_p99_ms"]
+
+    # The leaked reference is reported but never compared against
+    eligible = [r for r in rows if r["variant"] != "reference" and r["accuracy"] >= baseline["accuracy"] - MAX_ACCURACY_LOSS]
+    return min(eligible, key=p99)["variant"]
+
+
+def run_variants(dfs):
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    train, test = _split(dfs)
+    X_train, y_train, X_test, y_test = _preprocess(train, test)
+    variants = build_variants(X_train, y_train)
+
+    rows = []
+    for name, model in variants.items():
+        print(f"Measuring {name}...")
+        rows.append(measure(name, model, X_test, y_test))
+
+    choice = recommend(rows)
+    report = {"test_rows": int(len(X_test)), "variants": rows, "recommended_low_end": choice}
+    with open(os.path.join(VARIANTS_DIR, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    table = _table(rows)
+    with open(os.path.join(VARIANTS_DIR, "report.md"), "w") as f:
+        f.write(table + f"\n\nRecommended for LOW_END: {choice}\n")
+
+    print("\n" + table)
+    print(f"\nRecommended for LOW_END: {choice} (copy {VARIANTS_DIR}/{choice}.pkl to SolarServer_model.pkl)")
+    return report
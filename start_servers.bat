@@ -13,7 +13,7 @@ if not exist ".venv" (
 )
 
 echo Starting backend server on port 8000...
-start "SolarServers Backend" cmd /k "call .venv\Scripts\activate.bat && uvicorn SolarServers_server:app --host 0.0.0.0 --port 8000"
+start "SolarServers Backend" cmd /k "call .venv\Scripts\activate.bat && uvicorn SolarServers_server:app --host 0.0.0.0 --port 8000 --ws-per-message-deflate false"
 
 timeout /t 3 /nobreak > nul
 
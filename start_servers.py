@@ -31,7 +31,9 @@ def start_backend():
         python_cmd, "-m", "uvicorn",
         "SolarServers_server:app",
         "--host", "0.0.0.0",
-        "--port", "8000"
+        "--port", "8000",
+        # Large binary frames are deflated by the app; small frames are not worth compressing
+        "--ws-per-message-deflate", "false"
     ]
     return subprocess.Popen(cmd, cwd=os.getcwd())
 
@@ -89,4 +91,4 @@ def main():
         print("✅ All servers stopped. Goodbye!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
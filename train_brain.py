@@ -1,38 +1,56 @@
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import cross_val_score, GridSearchCV
+from sklearn.model_selection import GridSearchCV
+from sklearn.base import clone
 from sklearn.metrics import classification_report
 from sklearn.feature_selection import SelectKBest, f_classif
+from contextlib import contextmanager
+import argparse
 import joblib
 import numpy as np
 import os
-print("SOLARSERVER AI TRAINER - ADVANCED ENSEMBLE VERSION")
-print("=" * 55)
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import dataset_cache
+
 url_train = "https://raw.githubusercontent.com/defcom17/NSL_KDD/master/KDDTrain+.txt"
 url_test = "https://raw.githubusercontent.com/defcom17/NSL_KDD/master/KDDTest+.txt"
 local_train = "KDDTrain+.txt"
 local_test = "KDDTest+.txt"
 cols = ['duration','protocol_type','service','flag','src_bytes','dst_bytes','land','wrong_fragment','urgent','hot','num_failed_logins','logged_in','num_compromised','root_shell','su_attempted','num_root','num_file_creations','num_shells','num_access_files','num_outbound_cmds','is_host_login','is_guest_login','count','srv_count','serror_rate','srv_serror_rate','rerror_rate','srv_rerror_rate','same_srv_rate','diff_srv_rate','srv_diff_host_rate','dst_host_count','dst_host_srv_count','dst_host_same_srv_rate','dst_host_diff_srv_rate','dst_host_same_src_port_rate','dst_host_srv_diff_host_rate','dst_host_serror_rate','dst_host_srv_serror_rate','dst_host_rerror_rate','dst_host_srv_rerror_rate','label','difficulty']
+feature_cols = [col for col in cols if col not in ['label', 'difficulty']]
+categorical_cols = ['protocol_type', 'service', 'flag']
+# Anything that changes the cached matrix must be part of the dataset cache key
+PREPROCESSING = {"features": feature_cols, "categorical": categorical_cols, "k_best": 30, "dtype": "float32"}
 
-dfs = []
-for url, local_file, name in [(url_train, local_train, "train"), (url_test, local_test, "test")]:
-    if os.path.exists(local_file):
-        print(f"Loading local {name} dataset...")
-        df = pd.read_csv(local_file, names=cols, header=None)
-        print(f"Loaded {len(df)} {name} samples from local file")
-    else:
-        try:
-            print(f"Downloading {name} dataset...")
-            df = pd.read_csv(url, names=cols, header=None)
-            df.to_csv(local_file, index=False, header=False)
-            print(f"Downloaded and saved {len(df)} {name} samples")
-        except Exception as e:
-            print(f"Download failed for {name}: {e}")
-            continue
-    dfs.append(df)
-
-if len(dfs) == 0:
+
+def load_datasets():
+    """Returns {"train": df, "test": df} for whichever NSL-KDD files could be loaded"""
+    dfs = {}
+    for url, local_file, name in [(url_train, local_train, "train"), (url_test, local_test, "test")]:
+        if os.path.exists(local_file):
+            print(f"Loading local {name} dataset...")
+            df = pd.read_csv(local_file, names=cols, header=None)
+            print(f"Loaded {len(df)} {name} samples from local file")
+        else:
+            try:
+                print(f"Downloading {name} dataset...")
+                df = pd.read_csv(url, names=cols, header=None)
+                df.to_csv(local_file, index=False, header=False)
+                print(f"Downloaded and saved {len(df)} {name} samples")
+            except Exception as e:
+                print(f"Download failed for {name}: {e}")
+                continue
+        dfs[name] = df
+    return dfs
+
+
+def synthetic_data():
     print("No datasets loaded, using synthetic data...")
     np.random.seed(42)
     n = 5000
@@ -80,98 +98,262 @@ if len(dfs) == 0:
         np.random.uniform(0, 1, n),
     ])
     y = np.random.choice([0,1], n, p=[0.1, 0.9])
-    encoders = {}
     print(f"Generated {n} samples")
-else:
-    # Combine train and test for more data
-    df = pd.concat(dfs, ignore_index=True)
-    print(f"Combined dataset: {len(df)} samples")
-    
-    # Features: all except label and difficulty
-    feature_cols = [col for col in cols if col not in ['label', 'difficulty']]
-    
-    # Sample test cases from real data BEFORE encoding
-    normal_sample = df[df['label'] == 'normal'].iloc[0][feature_cols].to_dict()
-    attack_sample = df[df['label'] != 'normal'].iloc[0][feature_cols].to_dict()
-    
-    # Preprocess data
+    return X, y
+
+
+def fit_encoders(df):
+    """Label-encode the categorical columns in place; labels become 1 = normal, 0 = attack"""
     df['label'] = df['label'].apply(lambda x: 1 if x == 'normal' else 0)
-    
-    # Encode categorical features
-    categorical_cols = ['protocol_type', 'service', 'flag']
     encoders = {}
     for col in categorical_cols:
         le = LabelEncoder()
         df[col] = le.fit_transform(df[col])
         encoders[col] = le
-    
-    X = df[feature_cols].values
-    y = df['label'].values
-
-print("\nAdvanced Training with Feature Selection and Tuning...")
-sc = StandardScaler()
-Xs = sc.fit_transform(X)
-
-# Feature selection
-selector = SelectKBest(score_func=f_classif, k=30)  # Select top 30 features
-Xs_selected = selector.fit_transform(Xs, y)
-selected_features = selector.get_support(indices=True)
-print(f"Selected {len(selected_features)} best features")
-
-# Hyperparameter tuning for RandomForest
-param_grid = {
-    'n_estimators': [100, 200],
-    'max_depth': [10, 20, None],
-    'min_samples_split': [2, 5],
-    'min_samples_leaf': [1, 2]
-}
-clf = RandomForestClassifier(random_state=42, n_jobs=-1)
-grid_search = GridSearchCV(clf, param_grid, cv=3, scoring='accuracy', n_jobs=-1)
-grid_search.fit(Xs_selected, y)
-best_clf = grid_search.best_estimator_
-print(f"Best parameters: {grid_search.best_params_}")
-print(f"Best CV score: {grid_search.best_score_:.4f}")
-
-# Cross-validation with best model
-cv_scores = cross_val_score(best_clf, Xs_selected, y, cv=5, scoring='accuracy')
-print(f"Cross-validation accuracy: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
-
-# Final evaluation
-from sklearn.model_selection import train_test_split
-X_train, X_test, y_train, y_test = train_test_split(Xs_selected, y, test_size=0.2, random_state=42, stratify=y)
-best_clf.fit(X_train, y_train)
-y_pred = best_clf.predict(X_test)
-print("Final Validation Report:")
-print(classification_report(y_test, y_pred, target_names=['Attack', 'Normal']))
-
-joblib.dump(best_clf, "SolarServer_model.pkl")
-joblib.dump(sc, "SolarServer_scaler.pkl")
-joblib.dump(encoders, "SolarServer_encoders.pkl")
-joblib.dump(selector, "SolarServer_selector.pkl")
-print("Advanced model saved with feature selection and hyperparameter tuning")
-
-print("\nTesting...")
-if 'normal_sample' in locals() and 'attack_sample' in locals():
-    def preprocess_sample(sample, encoders, scaler, selector):
-        df_sample = pd.DataFrame([sample])
-        for col, enc in encoders.items():
-            if col in df_sample.columns:
-                df_sample[col] = enc.transform(df_sample[col])
-        X_sample = df_sample.values
-        X_scaled = scaler.transform(X_sample)
-        return selector.transform(X_scaled)
-    
-    normal_processed = preprocess_sample(normal_sample, encoders, sc, selector)
-    attack_processed = preprocess_sample(attack_sample, encoders, sc, selector)
-    pred_normal = best_clf.predict(normal_processed)[0]
-    pred_attack = best_clf.predict(attack_processed)[0]
-    print(f"   Normal sample: {'SAFE' if pred_normal == 1 else 'THREAT'}")
-    print(f"   Attack sample: {'SAFE' if pred_attack == 1 else 'THREAT'}")
-    
-    # Show probabilities
-    prob_normal = best_clf.predict_proba(normal_processed)[0]
-    prob_attack = best_clf.predict_proba(attack_processed)[0]
-    print(f"   Normal confidence: {prob_normal[1]:.4f} (SAFE)")
-    print(f"   Attack confidence: {prob_attack[0]:.4f} (THREAT)")
-else:
-    print("   Skipping test predictions with synthetic data")
+    return encoders
+
+
+def fit_preprocessing(X, y):
+    sc = StandardScaler()
+    Xs = sc.fit_transform(X)
+
+    # Feature selection
+    selector = SelectKBest(score_func=f_classif, k=PREPROCESSING['k_best'])  # Select top 30 features
+    Xs_selected = selector.fit_transform(Xs, y)
+    selected_features = selector.get_support(indices=True)
+    print(f"Selected {len(selected_features)} best features")
+    return sc, selector, Xs_selected
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2**20
+    # ru_maxrss is KB on Linux, bytes on macOS
+    unit = 2**20 if sys.platform == "darwin" else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit
+
+
+class WorkerPeak:
+    """Largest RSS of any live worker process in MB, sampled in the background.
+
+    Search workers stay alive until their pool shuts down, and RUSAGE_CHILDREN
+    only counts reaped children, so they have to be polled while they run.
+    """
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        import psutil
+        me = psutil.Process()
+        while True:
+            for child in me.children(recursive=True):
+                try:
+                    self.mb = max(self.mb, child.memory_info().rss / 2**20)
+                except psutil.Error:  # exited between listing and reading
+                    pass
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    with WorkerPeak() as workers:
+        yield
+    print(f"[{name}] {time.perf_counter() - start:.1f}s wall | peak RSS so far {peak_rss_mb():.0f} MB, largest worker {workers.mb:.0f} MB")
+
+
+def shared_matrix(X, directory):
+    """X as a read-only memmap, so search workers map one file instead of each getting a pickled copy"""
+    if isinstance(X, np.memmap):
+        return X
+    path = os.path.join(directory, "Xs_selected.npy")
+    np.save(path, np.ascontiguousarray(X))
+    return np.load(path, mmap_mode="r")
+
+
+def search(Xs_selected, y, mode="halving"):
+    # Hyperparameter tuning for RandomForest
+    param_grid = {
+        'n_estimators': [100, 200],
+        'max_depth': [10, 20, None],
+        'min_samples_split': [2, 5],
+        'min_samples_leaf': [1, 2]
+    }
+    # Candidates and folds run in parallel, so each forest builds on one core
+    clf = RandomForestClassifier(random_state=42, n_jobs=1)
+    if mode == "halving":
+        # Every candidate starts on a small sample; only the best third moves on to 3x the rows
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        from sklearn.model_selection import HalvingGridSearchCV
+        searcher = HalvingGridSearchCV(clf, param_grid, cv=3, factor=3, scoring='accuracy',
+                                       n_jobs=-1, refit=False, random_state=42)
+    else:
+        searcher = GridSearchCV(clf, param_grid, cv=3, scoring='accuracy', n_jobs=-1, refit=False)
+
+    tmp = tempfile.mkdtemp(prefix="solar-train-")
+    try:
+        searcher.fit(shared_matrix(Xs_selected, tmp), y)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if mode == "halving":
+        rounds = ", ".join(f"{c} x {n}" for c, n in zip(searcher.n_candidates_, searcher.n_resources_))
+        print(f"Successive halving rounds (candidates x rows): {rounds}")
+    print(f"Best parameters: {searcher.best_params_}")
+    print(f"Best CV score: {searcher.best_score_:.4f}")
+
+    # Fold scores of the winner, reused from the search instead of another cross-validation pass
+    best = searcher.best_index_
+    cv_scores = np.array([searcher.cv_results_[f"split{i}_test_score"][best] for i in range(searcher.n_splits_)])
+    print(f"Cross-validation accuracy: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
+    return clone(clf).set_params(**searcher.best_params_, n_jobs=-1)
+
+
+def preprocess_sample(sample, encoders, scaler, selector):
+    df_sample = pd.DataFrame([sample])
+    for col, enc in encoders.items():
+        if col in df_sample.columns:
+            df_sample[col] = enc.transform(df_sample[col])
+    X_sample = df_sample.values
+    X_scaled = scaler.transform(X_sample)
+    return selector.transform(X_scaled)
+
+
+def preprocess(dfs):
+    """Raw datasets -> (Xs_selected, y, transformers, samples)"""
+    if len(dfs) == 0:
+        X, y = synthetic_data()
+        encoders = {}
+        samples = {}
+    else:
+        # Combine train and test for more data
+        df = pd.concat(list(dfs.values()), ignore_index=True)
+        print(f"Combined dataset: {len(df)} samples")
+
+        # Sample test cases from real data BEFORE encoding
+        samples = {
+            "normal": df[df['label'] == 'normal'].iloc[0][feature_cols].to_dict(),
+            "attack": df[df['label'] != 'normal'].iloc[0][feature_cols].to_dict(),
+        }
+
+        # Preprocess data
+        encoders = fit_encoders(df)
+
+        X = df[feature_cols].values
+        y = df['label'].values
+
+    sc, selector, Xs_selected = fit_preprocessing(X, y)
+    # Trees split on float32 anyway, so this loses nothing
+    Xs_selected = Xs_selected.astype(np.float32)
+    return Xs_selected, y, {"encoders": encoders, "scaler": sc, "selector": selector}, samples
+
+
+def load_training_data(refresh=False):
+    """Preprocessed training matrix, from the dataset cache when the sources are unchanged"""
+    start = time.perf_counter()
+    sources = [f for f in (local_train, local_test) if os.path.exists(f)]
+    if not refresh and sources:
+        key = dataset_cache.cache_key(sources, PREPROCESSING)
+        hit = dataset_cache.load(key)
+        if hit:
+            X, y, transformers, meta = hit
+            print(f"Loaded cached dataset {key}: {len(y)} samples x {X.shape[1]} features in {time.perf_counter() - start:.3f}s")
+            return X, y, transformers, meta.get("samples", {})
+
+    X, y, transformers, samples = preprocess(load_datasets())
+    sources = [f for f in (local_train, local_test) if os.path.exists(f)]
+    if sources and samples:
+        key = dataset_cache.cache_key(sources, PREPROCESSING)
+        X = dataset_cache.store(key, X, y, transformers, {"sources": sources, "params": PREPROCESSING, "samples": samples})
+        dataset_cache.prune(keep=key)
+        print(f"Cached preprocessed dataset as {key} in {dataset_cache.CACHE_DIR}/")
+    print(f"Dataset ready in {time.perf_counter() - start:.2f}s")
+    return X, y, transformers, samples
+
+
+def train(Xs_selected, y, transformers, samples, search_mode="halving"):
+    sc, selector, encoders = transformers["scaler"], transformers["selector"], transformers["encoders"]
+    print("\nAdvanced Training with Feature Selection and Tuning...")
+    with stage("search"):
+        best_clf = search(Xs_selected, y, search_mode)
+
+    # Final evaluation; this is also the one fit of the saved model
+    with stage("final fit"):
+        from sklearn.model_selection import train_test_split
+        X_train, X_test, y_train, y_test = train_test_split(Xs_selected, y, test_size=0.2, random_state=42, stratify=y)
+        best_clf.fit(X_train, y_train)
+        y_pred = best_clf.predict(X_test)
+    print("Final Validation Report:")
+    print(classification_report(y_test, y_pred, target_names=['Attack', 'Normal']))
+
+    with stage("save"):
+        joblib.dump(best_clf, "SolarServer_model.pkl")
+        joblib.dump(sc, "SolarServer_scaler.pkl")
+        joblib.dump(encoders, "SolarServer_encoders.pkl")
+        joblib.dump(selector, "SolarServer_selector.pkl")
+        print("Advanced model saved with feature selection and hyperparameter tuning")
+
+        # Flat array artifact for the compiled inference backend (python forest_compiler.py verify)
+        from forest_compiler import export
+        export(best_clf, sc, selector, encoders)
+
+    print("\nTesting...")
+    if samples:
+        normal_processed = preprocess_sample(samples["normal"], encoders, sc, selector)
+        attack_processed = preprocess_sample(samples["attack"], encoders, sc, selector)
+        pred_normal = best_clf.predict(normal_processed)[0]
+        pred_attack = best_clf.predict(attack_processed)[0]
+        print(f"   Normal sample: {'SAFE' if pred_normal == 1 else 'THREAT'}")
+        print(f"   Attack sample: {'SAFE' if pred_attack == 1 else 'THREAT'}")
+
+        # Show probabilities
+        prob_normal = best_clf.predict_proba(normal_processed)[0]
+        prob_attack = best_clf.predict_proba(attack_processed)[0]
+        print(f"   Normal confidence: {prob_normal[1]:.4f} (SAFE)")
+        print(f"   Attack confidence: {prob_attack[0]:.4f} (THREAT)")
+    else:
+        print("   Skipping test predictions with synthetic data")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the SolarServers threat model")
+    parser.add_argument("--variants", action="store_true",
+                        help="train smaller/distilled model variants and write a size/latency report")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"rebuild the preprocessed dataset in {dataset_cache.CACHE_DIR}/ from the CSV files")
+    parser.add_argument("--search", choices=["halving", "grid"], default="halving",
+                        help="successive halving (default) or the exhaustive grid search")
+    args = parser.parse_args()
+
+    print("SOLARSERVER AI TRAINER - ADVANCED ENSEMBLE VERSION")
+    print("=" * 55)
+
+    if args.variants:
+        from model_variants import run_variants
+        run_variants(load_datasets())
+    else:
+        with stage("dataset"):
+            data = load_training_data(refresh=args.no_cache)
+        train(*data, search_mode=args.search)
+
+
+if __name__ == "__main__":
+    main()